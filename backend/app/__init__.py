@@ -1,9 +1,48 @@
-from flask import Flask, jsonify
+import os
+import time
+import logging
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 from app.routes import search_bp
+from app.services import embedding_batcher, INDEX_NAME
+from app import resources
+from app.cache import cache_stats
+from app.index_version import get_index_version, resolve_index_name
+from app.responses import FastJSONProvider, compress_response
+from app import logging_config, metrics as app_metrics
+
+access_logger = logging.getLogger("app.access")
+
+
+def _metric_gauges():
+    """Point-in-time values for /api/metrics, as (name, labels, value, help) tuples"""
+    gauges = [
+        (
+            "index_info",
+            {"version": get_index_version(INDEX_NAME), "index": resolve_index_name(INDEX_NAME)},
+            1,
+            "Search index version and Pinecone index being served",
+        ),
+        ("log_records_dropped", {}, logging_config.dropped_records(), "Log records dropped on a full queue"),
+    ]
+    for kind, counts in resources.pool_stats().items():
+        for stat, value in counts.items():
+            gauges.append((f"pool_{stat}", {"resource": kind}, value, f"Shared client {stat}"))
+    for name, stats in cache_stats().items():
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)):
+                gauges.append((f"cache_{stat}", {"cache": name}, value, f"Cache {stat}"))
+    if embedding_batcher is not None:
+        for stat, value in embedding_batcher.stats().items():
+            gauges.append((f"embedding_batcher_{stat}", {}, value, f"Embedding batcher {stat}"))
+    return gauges
+
 
 def create_app():
+    logging_config.configure_logging()
     app = Flask(__name__)
+    # orjson-backed jsonify() when orjson is installed
+    app.json = FastJSONProvider(app)
     # Enable CORS for all origins
     # CORS(
     #     app,
@@ -13,12 +52,91 @@ def create_app():
     #     methods=["GET", "POST", "OPTIONS"]
     # )
 
+    @app.before_request
+    def start_request_log():
+        g.request_start = time.perf_counter()
+        logging_config.start_request(request.headers.get("X-Request-ID"))
+
+    @app.after_request
+    def log_request(response):
+        fields = logging_config.current_request_fields()
+        if fields is None:
+            return response
+        response.headers["X-Request-ID"] = fields["request_id"]
+        duration = time.perf_counter() - g.request_start
+        # The route pattern, not the path, keeps the label set bounded
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        app_metrics.observe("http_request_duration_seconds", duration, endpoint=endpoint)
+        app_metrics.increment(
+            "http_requests_total", endpoint=endpoint, status=str(response.status_code)
+        )
+        access_logger.info(
+            "%s %s %d",
+            request.method,
+            request.path,
+            response.status_code,
+            extra={
+                "sampled": True,
+                "fields": {
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "duration_ms": round(duration * 1000, 3),
+                    **{key: value for key, value in fields.items() if key != "request_id"},
+                },
+            },
+        )
+        return response
+
     @app.route("/api/health", methods=["GET"])
     def health_check():
         """Health check endpoint to verify the API is running"""
         return jsonify({"status": "ok", "message": "API is running"})
 
-    # Register the search blueprint
-    app.register_blueprint(search_bp)
+    @app.route("/api/metrics", methods=["GET"])
+    def metrics():
+        """
+        Latency histograms, counters and cache/pool statistics, in the
+        Prometheus text format, or as JSON with ?format=json
+        """
+        if request.args.get("format") == "json":
+            payload = {
+                "index_version": get_index_version(INDEX_NAME),
+                "index": resolve_index_name(INDEX_NAME),
+                "pools": resources.pool_stats(),
+                "caches": cache_stats(),
+                "log_records_dropped": logging_config.dropped_records(),
+                **app_metrics.summary(),
+            }
+            if embedding_batcher is not None:
+                payload["embedding_batcher"] = embedding_batcher.stats()
+            return jsonify(payload)
+
+        return Response(
+            app_metrics.render_prometheus(_metric_gauges()),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+    # Register the search blueprint. SERVING_MODE=async swaps in async views
+    # that overlap upstream calls within a request (needs flask[async])
+    if os.getenv("SERVING_MODE", "sync").lower() == "async":
+        from app.async_routes import async_search_bp
+
+        app.register_blueprint(async_search_bp)
+    else:
+        app.register_blueprint(search_bp)
+
+    # gzip/brotli for JSON and NDJSON responses, negotiated via Accept-Encoding
+    if os.getenv("COMPRESS_RESPONSES", "true").lower() in ("1", "true", "yes"):
+
+        @app.after_request
+        def compress(response):
+            return compress_response(response, request.headers.get("Accept-Encoding", ""))
+
+    # With gunicorn's preload_app this runs once in the master, so the model
+    # is loaded before forking and its memory is shared by all workers
+    if os.getenv("PRELOAD_RESOURCES", "").lower() in ("1", "true", "yes"):
+        resources.preload()
+    resources.report_startup("app")
 
     return app
@@ -0,0 +1,117 @@
+import logging
+from flask import Blueprint, request, jsonify
+from app.async_services import (
+    search_apartments_async,
+    search_apartments_paginated_async,
+    attach_previews_to_results_async,
+    get_apartment_preview_by_id_async,
+    get_apartment_previews_by_ids_async,
+    get_apartment_details_by_id_async,
+)
+from app.logging_config import set_request_field
+from app.responses import stream_results
+from app.routes import parse_search_args, parse_previews_body
+from app.services import CursorExpiredError, InvalidCursorError
+
+logger = logging.getLogger(__name__)
+
+# Async versions of the views in app.routes, registered instead of them when
+# SERVING_MODE=async. Request parsing and response shapes are shared.
+async_search_bp = Blueprint("async_search", __name__)
+
+
+@async_search_bp.route("/api/search", methods=["GET"])
+async def search():
+    """Async version of routes.search; see it for the parameters"""
+    try:
+        params, error = parse_search_args(request.args, request.headers.get("Accept", ""))
+        if error:
+            return jsonify({"error": error}), 400
+
+        response = {}
+        if params["paginate"]:
+            results, response["next_cursor"] = await search_apartments_paginated_async(
+                params["query"],
+                params["filter_dict"],
+                params["top_k"],
+                params["image_urls"],
+                params["cursor"],
+                params["hybrid"],
+            )
+        else:
+            results = await search_apartments_async(
+                params["query"],
+                params["filter_dict"],
+                params["top_k"],
+                params["image_urls"],
+                params["hybrid"],
+            )
+
+        set_request_field("result_count", len(results))
+        if "preview" in params["include"]:
+            results = await attach_previews_to_results_async(results, params["query"])
+
+        if params["stream"]:
+            # Everything is built by now: the body can't be generated inside
+            # this view's context once it has returned
+            return stream_results(
+                results, response, ndjson=params["stream"] == "ndjson", with_context=False
+            )
+
+        response["results"] = results
+        return jsonify(response)
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
+    except CursorExpiredError as e:
+        return jsonify({"error": str(e)}), 410
+    except Exception as e:
+        error_message = f"Error in search endpoint: {str(e)}"
+        logger.exception("Error in search endpoint")
+        return jsonify({"error": error_message}), 500
+
+
+@async_search_bp.route("/api/apartment/preview/<string:apartment_id>", methods=["GET"])
+async def apartment_preview(apartment_id):
+    """Async version of routes.apartment_preview"""
+    try:
+        query = request.args.get("query", "")
+        apartment = await get_apartment_preview_by_id_async(apartment_id, query)
+        if apartment is None:
+            return jsonify({"error": "Apartment not found"}), 404
+        return jsonify({"apartment": apartment})
+    except Exception as e:
+        error_message = f"Error in apartment preview endpoint: {str(e)}"
+        logger.exception("Error in apartment preview endpoint")
+        return jsonify({"error": error_message}), 500
+
+
+@async_search_bp.route("/api/apartment/previews", methods=["POST"])
+async def apartment_previews():
+    """Async version of routes.apartment_previews"""
+    try:
+        apartment_ids, query, error = parse_previews_body(request.get_json(silent=True))
+        if error:
+            return jsonify({"error": error}), 400
+
+        apartments, missing, failed = await get_apartment_previews_by_ids_async(apartment_ids, query)
+        return jsonify({"apartments": apartments, "missing": missing, "failed": failed})
+    except Exception as e:
+        error_message = f"Error in apartment previews endpoint: {str(e)}"
+        logger.exception("Error in apartment previews endpoint")
+        return jsonify({"error": error_message}), 500
+
+
+@async_search_bp.route("/api/apartment/details/<string:apartment_id>", methods=["GET"])
+async def apartment_details(apartment_id):
+    """Async version of routes.apartment_details"""
+    try:
+        query = request.args.get("query", "")
+        apartment = await get_apartment_details_by_id_async(apartment_id, query)
+        if apartment is None:
+            return jsonify({"error": "Apartment not found"}), 404
+
+        return jsonify({"apartment": apartment})
+    except Exception as e:
+        error_message = f"Error in apartment details endpoint: {str(e)}"
+        logger.exception("Error in apartment details endpoint")
+        return jsonify({"error": error_message}), 500
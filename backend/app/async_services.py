@@ -0,0 +1,192 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app import metrics, services
+
+logger = logging.getLogger(__name__)
+
+# Async counterparts of the search, preview and details services. Blocking
+# upstream calls (the embedding model, the vector store and OpenAI) run in
+# worker threads and independent ones are awaited together.
+#
+# Each upstream has its own concurrency limit. Flask runs every async view in
+# a fresh event loop, so the limits are threading semaphores shared by all
+# requests in the process rather than asyncio ones bound to a single loop.
+
+UPSTREAM_LIMITS = {
+    "openai": int(os.getenv("ASYNC_OPENAI_CONCURRENCY", "4")),
+    "vector_store": int(os.getenv("ASYNC_VECTOR_STORE_CONCURRENCY", "16")),
+    "embedding": int(os.getenv("ASYNC_EMBEDDING_CONCURRENCY", "4")),
+}
+# How long a call waits for a free upstream slot before giving up
+UPSTREAM_WAIT_SECONDS = float(os.getenv("ASYNC_UPSTREAM_WAIT_SECONDS", "10"))
+
+_semaphores = {
+    upstream: threading.BoundedSemaphore(limit) for upstream, limit in UPSTREAM_LIMITS.items()
+}
+
+
+# Runs the text-only fallback embedding of image searches alongside the vision call
+_fallback_executor = ThreadPoolExecutor(
+    max_workers=UPSTREAM_LIMITS["embedding"], thread_name_prefix="fallback-embedding"
+)
+
+
+class UpstreamBusyError(Exception):
+    """Raised when an upstream's concurrency limit stays saturated for too long"""
+
+
+def _run_limited(upstream, fn, *args):
+    semaphore = _semaphores[upstream]
+    if not semaphore.acquire(timeout=UPSTREAM_WAIT_SECONDS):
+        metrics.increment("upstream_rejections_total", upstream=upstream)
+        raise UpstreamBusyError(f"Too many concurrent {upstream} calls")
+    try:
+        return fn(*args)
+    finally:
+        semaphore.release()
+
+
+async def _call(upstream, fn, *args):
+    return await asyncio.to_thread(_run_limited, upstream, fn, *args)
+
+
+async def create_embedding_async(text):
+    """Async version of services.create_embedding"""
+    return await _call("embedding", services.create_embedding, text)
+
+
+async def get_search_embedding_async(query, image_urls=None):
+    """
+    Async version of services.get_search_embedding. For image searches with a
+    text query, the text-only fallback embedding is computed while the vision
+    call is in flight, so a vision failure costs no extra latency.
+
+    Args:
+        query (str): The search query
+        image_urls (list, optional): List of image URLs to analyze. Defaults to None.
+
+    Returns:
+        list: The query embedding, or None if no usable query could be built
+    """
+    def embed(text):
+        return _run_limited("embedding", services.create_embedding, text)
+
+    def describe(search_text, urls):
+        return _run_limited("openai", services.describe_images, search_text, urls)
+
+    def start_fallback():
+        # Not tied to the request's event loop, so an unused fallback can
+        # finish after the request does
+        return _fallback_executor.submit(embed, query.strip()).result
+
+    return await asyncio.to_thread(
+        services.build_search_embedding, query, image_urls, describe, embed, start_fallback
+    )
+
+
+async def search_apartments_async(query, filter_dict=None, top_k=10, image_urls=None, hybrid=False):
+    """Async version of services.search_apartments"""
+    cache_key = services.search_result_cache_key(query, filter_dict, top_k, image_urls, hybrid)
+    cached = services.get_cached_search_results(cache_key)
+    if cached is not None:
+        return cached
+
+    query_embedding = await get_search_embedding_async(query, image_urls)
+    if query_embedding is None:
+        logger.warning("Failed to create embedding for query")
+        return []
+    if hybrid:
+        results = await _call(
+            "vector_store", services.hybrid_query, query, query_embedding, filter_dict, top_k
+        )
+    else:
+        results = await _call("vector_store", services.query_index, query_embedding, filter_dict, top_k)
+    return services.cache_search_results(cache_key, results)
+
+
+async def search_apartments_paginated_async(
+    query, filter_dict=None, page_size=50, image_urls=None, cursor=None, hybrid=False
+):
+    """Async version of services.search_apartments_paginated"""
+    if cursor:
+        return services.get_results_page(cursor, page_size)
+    query_embedding = await get_search_embedding_async(query, image_urls)
+    if query_embedding is None:
+        logger.warning("Failed to create embedding for query")
+        return [], None
+    return await _call(
+        "vector_store",
+        services.start_paginated_search,
+        query_embedding,
+        filter_dict,
+        page_size,
+        query,
+        hybrid,
+    )
+
+
+async def get_apartment_previews_by_ids_async(apartment_ids, query=None):
+    """
+    Async version of services.get_apartment_previews_by_ids: the query is
+    embedded once and every apartment's images are ranked concurrently
+
+    Args:
+        apartment_ids (list): The IDs of the apartments, in the order to return them
+        query (str, optional): The search query to rank images by. Default is None.
+
+    Returns:
+        tuple: (list of preview dicts in request order, list of IDs that were not
+        found, list of IDs whose preview could not be built)
+    """
+    apartments = []
+    missing = []
+    for apartment_id in apartment_ids:
+        apartment = services.catalog.get(apartment_id)
+        if apartment is None:
+            missing.append(apartment_id)
+        else:
+            apartments.append(apartment)
+
+    query_embedding = await create_embedding_async(query) if query else None
+    # Without the query embedding every apartment would retry it; keep catalog order instead
+    ranking_query = query if query_embedding else None
+
+    async def build(apartment):
+        try:
+            return await _call(
+                "vector_store", services._build_preview, apartment, ranking_query, query_embedding
+            )
+        except Exception as e:
+            logger.error("Error building preview for apartment %s: %s", apartment.get("id"), e)
+            return None
+
+    previews = await asyncio.gather(*(build(apartment) for apartment in apartments))
+    failed = [apartment.get("id") for apartment, preview in zip(apartments, previews) if preview is None]
+    return [p for p in previews if p is not None], missing, failed
+
+
+async def attach_previews_to_results_async(results, query=None):
+    """Async version of services.attach_previews_to_results"""
+    previews, _, _ = await get_apartment_previews_by_ids_async([r["id"] for r in results], query)
+    previews_by_id = {preview["id"]: preview for preview in previews}
+    for result in results:
+        result["preview"] = previews_by_id.get(result["id"])
+    return results
+
+
+async def get_apartment_preview_by_id_async(apartment_id, query=None):
+    """Async version of services.get_apartment_preview_by_id"""
+    if query:
+        # Warm the embedding cache under the embedding limit before ranking
+        await create_embedding_async(query)
+    return await _call("vector_store", services.get_apartment_preview_by_id, apartment_id, query)
+
+
+async def get_apartment_details_by_id_async(apartment_id, query=None):
+    """Async version of services.get_apartment_details_by_id"""
+    if query:
+        await create_embedding_async(query)
+    return await _call("vector_store", services.get_apartment_details_by_id, apartment_id, query)
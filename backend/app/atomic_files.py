@@ -0,0 +1,58 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# fcntl is POSIX-only; without it builds are still atomic per file, just not
+# serialized across processes
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOCK_FILE = ".build.lock"
+
+
+def write_atomically(path, write, mode="wb"):
+    """
+    Write a file through a uniquely named temp file in the same directory and
+    rename it into place, so readers and concurrent writers never see a
+    partial file
+
+    Args:
+        path (str): The destination file
+        write (callable): Called with the open temp file to write the contents
+        mode (str, optional): "wb" or "w". Defaults to "wb".
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def build_lock(directory):
+    """
+    Hold an exclusive lock on a directory across processes, e.g. while one
+    gunicorn worker builds an on-disk index the others would otherwise build too
+
+    Args:
+        directory (str): The index directory; created if missing
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,318 @@
+import os
+import logging
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Every cache built through create_cache is registered here by name so the
+# metrics endpoint can report on all of them
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with LRU eviction and a per-entry TTL.
+
+    Entries older than ttl seconds are treated as misses and dropped; once the
+    cache holds maxsize entries, the least recently used one is evicted.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Store value under key, evicting the least recently used entry if full
+
+        Args:
+            key (str): The cache key
+            value: The value to store
+            ttl (float, optional): Seconds the entry stays valid. Defaults to the cache's ttl.
+        """
+        if ttl is None:
+            ttl = self.ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+class SqliteCache:
+    """
+    Cache stored in a local SQLite file so every worker process on the host
+    shares the same warm entries.
+
+    Uses the same LRU + TTL policy as TTLCache: expired rows are misses, and
+    when the table grows past maxsize the least recently accessed rows are
+    deleted. Values go through dumps/loads (JSON by default) on the way in
+    and out.
+    """
+
+    # Enforce maxsize every this many writes rather than on every write
+    _PRUNE_EVERY = 64
+
+    def __init__(self, path, maxsize=10000, ttl=3600, dumps=None, loads=None):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._dumps = dumps or (lambda value: json.dumps(value))
+        self._loads = loads or (lambda raw: json.loads(raw))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Caches are often created at import time, in a gunicorn master that
+        # later forks; use a throwaway connection so none is inherited
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+        finally:
+            conn.close()
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads or carried
+        # across fork; keep one per thread, opened lazily by the current process
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            # Abandon (don't close) a connection inherited from the parent:
+            # closing it could touch the parent's WAL state
+            self._local.conn = None
+            self._local.pid = pid
+        conn = self._local.conn
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        return self.get_with_ttl(key)[0]
+
+    def get_with_ttl(self, key):
+        """Return (value, seconds until it expires) for key, or (None, None) on a miss"""
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None, None
+            value, expires_at = row
+            if expires_at <= now:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._count("expirations")
+                self._count("misses")
+                return None, None
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count("hits")
+            return self._loads(value), expires_at - now
+        except sqlite3.Error as e:
+            logger.warning("Error reading from shared cache %s: %s", self.path, e)
+            self._count("misses")
+            return None, None
+
+    def set(self, key, value):
+        """Store value under key"""
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, self._dumps(value), now + self.ttl, now),
+            )
+            with self._lock:
+                self._writes += 1
+                prune = self._writes % self._PRUNE_EVERY == 0
+            if prune:
+                self._prune(conn, now)
+        except sqlite3.Error as e:
+            logger.warning("Error writing to shared cache %s: %s", self.path, e)
+
+    def _prune(self, conn, now):
+        expired = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+        overflow = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.maxsize
+        evicted = 0
+        if overflow > 0:
+            evicted = conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            ).rowcount
+        with self._lock:
+            self.expirations += max(expired, 0)
+            self.evictions += max(evicted, 0)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "maxsize": self.maxsize,
+            "path": self.path,
+        }
+
+
+class TieredCache:
+    """
+    In-process TTLCache in front of a shared SqliteCache.
+
+    Lookups try the local tier first and fall back to the shared one,
+    copying shared hits into the local tier for the rest of their shared
+    lifetime. Writes go to both tiers.
+    """
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value, remaining = self.shared.get_with_ttl(key)
+        if value is not None:
+            # Don't let the copy outlive the shared entry it came from
+            self.local.set(key, value, ttl=min(remaining, self.local.ttl))
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        self.shared.set(key, value)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self):
+        local = self.local.stats()
+        shared = self.shared.stats()
+        hits = local["hits"] + shared["hits"]
+        # Every lookup goes through the local tier; only shared misses are real misses
+        lookups = local["hits"] + local["misses"]
+        return {
+            "hits": hits,
+            "misses": shared["misses"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "local": local,
+            "shared": shared,
+        }
+
+
+def create_cache(name, maxsize=1024, ttl=3600, shared_path=None, shared_maxsize=None,
+                 dumps=None, loads=None):
+    """
+    Build a cache and register it under name for metrics reporting
+
+    Args:
+        name (str): Name the cache is reported under
+        maxsize (int, optional): Max entries held in process. Defaults to 1024.
+        ttl (float, optional): Seconds an entry stays valid. Defaults to 3600.
+        shared_path (str, optional): SQLite file for a cross-process tier. Defaults to None.
+        shared_maxsize (int, optional): Max entries in the shared tier. Defaults to 10 * maxsize.
+        dumps (callable, optional): Serializer for shared-tier values. Defaults to JSON.
+        loads (callable, optional): Deserializer for shared-tier values. Defaults to JSON.
+
+    Returns:
+        TTLCache or TieredCache: The cache
+    """
+    cache = TTLCache(maxsize=maxsize, ttl=ttl)
+    if shared_path:
+        shared = SqliteCache(
+            shared_path,
+            maxsize=shared_maxsize or maxsize * 10,
+            ttl=ttl,
+            dumps=dumps,
+            loads=loads,
+        )
+        cache = TieredCache(cache, shared)
+    with _registry_lock:
+        _registry[name] = cache
+    return cache
+
+
+def cache_stats():
+    """
+    Get statistics for every registered cache
+
+    Returns:
+        dict: {cache name: stats dict}
+    """
+    with _registry_lock:
+        caches = dict(_registry)
+    return {name: cache.stats() for name, cache in caches.items()}
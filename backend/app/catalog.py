@@ -0,0 +1,128 @@
+import os
+import logging
+import json
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ApartmentCatalog:
+    """
+    In-memory view of apartments.json indexed by apartment id.
+
+    The file is parsed once and kept as a dict so lookups are O(1). Every
+    access stats the file; when its mtime or size changes the catalog is
+    re-parsed into a fresh snapshot and swapped in with a single assignment,
+    so concurrent readers always see either the old or the new data, never a
+    partially built index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # (file signature, apartments list, id -> apartment dict)
+        self._snapshot = (None, [], {})
+
+    def _file_signature(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self, signature):
+        with open(self.path, "r") as f:
+            apartments = json.load(f)
+        by_id = {}
+        for apartment in apartments:
+            apartment_id = apartment.get("id")
+            if apartment_id is not None:
+                by_id[apartment_id] = apartment
+        self._snapshot = (signature, apartments, by_id)
+        logger.info("Loaded %d apartments from %s", len(by_id), self.path)
+
+    def _current(self):
+        """Return the current snapshot, reloading first if the file changed."""
+        snapshot = self._snapshot
+        signature = self._file_signature()
+        if signature == snapshot[0]:
+            return snapshot
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            if self._snapshot[0] != signature:
+                try:
+                    self._load(signature)
+                except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                    # The file is probably mid-write; keep serving the old data
+                    if self._snapshot[0] is None:
+                        raise
+                    logger.warning("Error reloading apartment catalog, keeping previous version: %s", e)
+            return self._snapshot
+
+    @property
+    def version(self):
+        """Signature of the loaded file; changes whenever the catalog is reloaded"""
+        return self._current()[0]
+
+    def get(self, apartment_id):
+        """
+        Look up a single apartment
+
+        Args:
+            apartment_id (str): The ID of the apartment
+
+        Returns:
+            dict: The raw apartment record or None if not found
+        """
+        return self._current()[2].get(apartment_id)
+
+    def all(self):
+        """
+        Get every apartment in the catalog
+
+        Returns:
+            list: Apartment records in file order
+        """
+        return self._current()[1]
+
+    def __len__(self):
+        return len(self._current()[2])
+
+
+def _max_count(text):
+    # "1-2 Beds" -> 2, "Studio" -> 0, mirroring scripts/src/pinecone_loader.py
+    text = str(text or "")
+    if "studio" in text.lower():
+        return 0
+    numbers = re.findall(r"\d+", text)
+    return max(int(n) for n in numbers) if numbers else 0
+
+
+def derive_filters(apartment):
+    """
+    Compute the filterable fields of an apartment the same way the index
+    loader does for Pinecone metadata
+
+    Args:
+        apartment (dict): A raw apartment record
+
+    Returns:
+        dict: bedrooms, bathrooms, price_min and price_max
+    """
+    rent = apartment.get("rent") or {}
+    price_min = rent.get("min")
+    price_max = rent.get("max")
+
+    # If either price is None, set it equal to the other
+    if price_min is None and price_max is not None:
+        price_min = price_max
+    elif price_max is None and price_min is not None:
+        price_max = price_min
+    elif price_min is None and price_max is None:
+        price_min = price_max = 0
+
+    return {
+        "bedrooms": _max_count(apartment.get("beds")),
+        "bathrooms": _max_count(apartment.get("baths")),
+        "price_min": price_min,
+        "price_max": price_max,
+    }
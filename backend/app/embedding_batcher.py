@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+
+class EmbeddingBatcher:
+    """
+    Gathers embedding requests from concurrent callers into batched
+    model.encode calls.
+
+    A single background thread waits for the first pending text, then keeps
+    collecting for up to max_wait_ms (or until max_batch_size texts are
+    queued) before encoding them all at once. Each caller blocks on its own
+    future and receives just its vector.
+    """
+
+    def __init__(self, get_model, max_batch_size=32, max_wait_ms=5):
+        self._get_model = get_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+
+    def _ensure_worker(self):
+        # A forked gunicorn worker inherits the object but not the thread
+        if self._thread is None or self._pid != os.getpid():
+            self._pending = []
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="embedding-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def encode(self, text):
+        """
+        Embed a single text as part of the next batch
+
+        Args:
+            text (str): The text to embed
+
+        Returns:
+            list: The embedding vector
+        """
+        future = Future()
+        with self._cond:
+            self._ensure_worker()
+            self._pending.append((text, future))
+            self._cond.notify()
+        return future.result()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[: self.max_batch_size]
+            del self._pending[: self.max_batch_size]
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self._get_model().encode(texts, batch_size=len(texts))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            self.largest_batch = max(self.largest_batch, len(texts))
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector.tolist())
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from app.catalog import derive_filters
+
+logger = logging.getLogger(__name__)
+
+# Numeric fields derived by app.catalog.derive_filters, one column each
+COLUMNS = ("price_min", "price_max", "bedrooms", "bathrooms")
+
+_COMPARISONS = {
+    "$gte": np.greater_equal,
+    "$gt": np.greater,
+    "$lte": np.less_equal,
+    "$lt": np.less,
+}
+
+
+class UnsupportedFilterError(ValueError):
+    """Raised when a filter uses a field or operator the columns can't evaluate"""
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class FilterIndex:
+    """
+    Column store of the filterable fields of every apartment in the catalog.
+
+    Each field is a float64 NumPy array aligned with a list of apartment ids,
+    so a Pinecone-style filter is evaluated as a handful of vectorized
+    comparisons over the whole catalog instead of one dict lookup per
+    apartment. Missing values are NaN and fail every range comparison, like
+    they do in app.vector_store.matches_filter. The columns are rebuilt when
+    the catalog changes.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _build(self, version):
+        start = time.perf_counter()
+        ids = []
+        values = {column: [] for column in COLUMNS}
+        for apartment in self.catalog.all():
+            if apartment.get("id") is None:
+                continue
+            ids.append(apartment["id"])
+            filters = derive_filters(apartment)
+            for column in COLUMNS:
+                values[column].append(_as_float(filters[column]))
+        logger.info("Built filter columns for %d apartments in %.3fs", len(ids), time.perf_counter() - start)
+        return {
+            "version": version,
+            "ids": np.asarray(ids, dtype=object),
+            "rows": {apartment_id: row for row, apartment_id in enumerate(ids)},
+            "columns": {column: np.asarray(values[column], dtype=np.float64) for column in COLUMNS},
+        }
+
+    def _current(self):
+        version = self.catalog.version
+        state = self._state
+        if state is not None and state["version"] == version:
+            return state
+        with self._lock:
+            if self._state is None or self._state["version"] != version:
+                self._state = self._build(version)
+            return self._state
+
+    def _id_mask(self, state, operands):
+        mask = np.zeros(len(state["ids"]), dtype=bool)
+        rows = [state["rows"][i] for i in operands if i in state["rows"]]
+        mask[rows] = True
+        return mask
+
+    def _condition_mask(self, state, field, condition):
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        mask = np.ones(len(state["ids"]), dtype=bool)
+        for op, operand in condition.items():
+            if field == "apartment_id":
+                if op in ("$eq", "$ne"):
+                    operand = [operand]
+                if op in ("$eq", "$in"):
+                    mask &= self._id_mask(state, operand)
+                elif op in ("$ne", "$nin"):
+                    mask &= ~self._id_mask(state, operand)
+                else:
+                    raise UnsupportedFilterError(f"Unsupported operator {op} for apartment_id")
+                continue
+
+            column = state["columns"].get(field)
+            if column is None:
+                raise UnsupportedFilterError(f"No filter column for {field}")
+            if op in _COMPARISONS:
+                mask &= _COMPARISONS[op](column, _as_float(operand))
+            elif op == "$eq":
+                mask &= column == _as_float(operand)
+            elif op == "$ne":
+                mask &= column != _as_float(operand)
+            elif op == "$in":
+                mask &= np.isin(column, [_as_float(v) for v in operand])
+            elif op == "$nin":
+                mask &= ~np.isin(column, [_as_float(v) for v in operand])
+            else:
+                raise UnsupportedFilterError(f"Unsupported filter operator: {op}")
+        return mask
+
+    def _mask(self, state, filter_dict):
+        mask = np.ones(len(state["ids"]), dtype=bool)
+        for field, condition in filter_dict.items():
+            if field == "$and":
+                for sub in condition:
+                    mask &= self._mask(state, sub)
+            elif field == "$or":
+                mask &= np.logical_or.reduce(
+                    [self._mask(state, sub) for sub in condition],
+                    initial=False,
+                )
+            else:
+                mask &= self._condition_mask(state, field, condition)
+        return mask
+
+    def candidate_ids(self, filter_dict):
+        """
+        Evaluate a metadata filter against the columns
+
+        Args:
+            filter_dict (dict): Pinecone-style filter on price_min, price_max,
+                bedrooms, bathrooms and apartment_id
+
+        Returns:
+            list: IDs of the matching apartments in catalog order, or None if the
+            filter uses other fields or operators and must be applied by the backend
+        """
+        state = self._current()
+        try:
+            mask = self._mask(state, filter_dict)
+        except UnsupportedFilterError:
+            return None
+        return state["ids"][mask].tolist()
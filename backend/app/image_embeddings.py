@@ -0,0 +1,104 @@
+import os
+import logging
+import json
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# On-disk layout (written by scripts/src/export_image_embeddings.py):
+#   embeddings.npy  float32 matrix of L2-normalized image embeddings, with all
+#                   rows of an apartment stored contiguously
+#   index.json      {"apartments": {apartment_id: [start, stop]}, "urls": [url per row]}
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_FILE = "index.json"
+
+
+class ImageEmbeddingMatrix:
+    """
+    Memory-mapped image embeddings grouped by apartment.
+
+    Ranking an apartment's photos is a single dot product between its slice
+    of the matrix and the query embedding, with no network call. The files
+    are re-opened when index.json changes (it is written last on export).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # (index.json signature, embeddings memmap, apartment ranges, urls)
+        self._snapshot = (None, None, {}, [])
+
+    def _signature(self):
+        stat = os.stat(os.path.join(self.directory, INDEX_FILE))
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _current(self):
+        snapshot = self._snapshot
+        signature = self._signature()
+        if signature == snapshot[0]:
+            return snapshot
+        with self._lock:
+            if self._snapshot[0] != signature:
+                with open(os.path.join(self.directory, INDEX_FILE), "r") as f:
+                    index = json.load(f)
+                embeddings = np.load(os.path.join(self.directory, EMBEDDINGS_FILE), mmap_mode="r")
+                self._snapshot = (signature, embeddings, index["apartments"], index["urls"])
+                logger.info(
+                    "Loaded %d image embeddings for %d apartments from %s",
+                    embeddings.shape[0],
+                    len(index["apartments"]),
+                    self.directory,
+                )
+            return self._snapshot
+
+    def __contains__(self, apartment_id):
+        return apartment_id in self._current()[2]
+
+    def rank(self, apartment_id, query_embedding, photo_urls):
+        """
+        Order an apartment's photos by similarity to the query
+
+        Args:
+            apartment_id (str): The ID of the apartment
+            query_embedding (list): The query embedding
+            photo_urls (list): The apartment's photo URLs
+
+        Returns:
+            list: photo_urls sorted most relevant first, or None if the
+            apartment has no stored image embeddings
+        """
+        _, embeddings, ranges, urls = self._current()
+        span = ranges.get(apartment_id)
+        if span is None:
+            return None
+        start, stop = span
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = embeddings[start:stop] @ query
+
+        url_score_map = {}
+        for url, score in zip(urls[start:stop], scores.tolist()):
+            if score > url_score_map.get(url, -1):
+                url_score_map[url] = score
+        return sorted(photo_urls, key=lambda u: url_score_map.get(u, -1), reverse=True)
+
+
+def load_image_embeddings():
+    """
+    Open the local image embedding matrix if one has been exported
+
+    Returns:
+        ImageEmbeddingMatrix: The matrix, or None if IMAGE_EMBEDDINGS_DIR has no export
+    """
+    directory = os.getenv(
+        "IMAGE_EMBEDDINGS_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), "image_embeddings"),
+    )
+    if not os.path.exists(os.path.join(directory, INDEX_FILE)):
+        return None
+    return ImageEmbeddingMatrix(directory)
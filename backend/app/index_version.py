@@ -0,0 +1,131 @@
+import os
+import time
+import logging
+import json
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Stamp file rewritten by scripts/src/pinecone_loader.py after every (re)index.
+# Caches of search results include the index version in their keys, so a
+# reindex makes every earlier entry unreachable. The version is read from the
+# Pinecone alias record below when it has one, and from this stamp otherwise
+# (e.g. with the local vector store).
+INDEX_VERSION_FILE = os.getenv(
+    "INDEX_VERSION_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "index_version.json"),
+)
+
+# Which versioned Pinecone index serves a logical index name, and the version
+# of its contents, are recorded in Pinecone itself as a single record in a
+# reserved namespace of the logical (base) index, so every deployed backend
+# sees a blue/green flip or an incremental update. It is re-read at most every
+# INDEX_ALIAS_REFRESH_SECONDS.
+ALIAS_NAMESPACE = os.getenv("INDEX_ALIAS_NAMESPACE", "index-alias")
+ALIAS_RECORD_ID = "live"
+INDEX_ALIAS_REFRESH_SECONDS = float(os.getenv("INDEX_ALIAS_REFRESH_SECONDS", "30"))
+
+_lock = threading.Lock()
+# (file signature, version string)
+_current = (None, "unversioned")
+
+_alias_lock = threading.Lock()
+# index name -> (monotonic time read, alias record metadata)
+_aliases = {}
+
+
+def _read_stamp():
+    global _current
+    try:
+        stat = os.stat(INDEX_VERSION_FILE)
+    except OSError:
+        return (None, "unversioned")
+    signature = (stat.st_mtime_ns, stat.st_size)
+    current = _current
+    if signature == current[0]:
+        return current
+
+    with _lock:
+        if _current[0] != signature:
+            try:
+                with open(INDEX_VERSION_FILE, "r") as f:
+                    stamp = json.load(f)
+                version = str(stamp["version"])
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Error reading index version stamp, keeping %s: %s", _current[1], e)
+                return _current
+            if version != _current[1]:
+                logger.info("Search index version is now %s", version)
+            _current = (signature, version)
+        return _current
+
+
+def get_index_version(index_name=None):
+    """
+    Get the version of the search index currently being served
+
+    Args:
+        index_name (str, optional): Logical index name whose alias record
+            carries the version. Defaults to None (read the stamp only).
+
+    Returns:
+        str: The version written by the loader, or "unversioned" if none has been
+    """
+    if index_name is not None:
+        version = _read_alias(index_name).get("version")
+        if version:
+            return str(version)
+    return _read_stamp()[1]
+
+
+def _fetch_alias(index_name):
+    from app.resources import get_index
+
+    response = get_index(index_name).fetch(ids=[ALIAS_RECORD_ID], namespace=ALIAS_NAMESPACE)
+    record = (response.vectors or {}).get(ALIAS_RECORD_ID)
+    return dict(getattr(record, "metadata", None) or {})
+
+
+def _read_alias(index_name):
+    if os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower() != "pinecone":
+        return {}
+    now = time.monotonic()
+    cached = _aliases.get(index_name)
+    if cached is not None and now - cached[0] < INDEX_ALIAS_REFRESH_SECONDS:
+        return cached[1]
+
+    # One thread refreshes while the rest keep serving the alias they had
+    if not _alias_lock.acquire(blocking=cached is None):
+        return cached[1]
+    try:
+        cached = _aliases.get(index_name)
+        if cached is not None and now - cached[0] < INDEX_ALIAS_REFRESH_SECONDS:
+            return cached[1]
+        previous = cached[1] if cached is not None else {}
+        try:
+            alias = _fetch_alias(index_name)
+        except Exception as e:
+            logger.warning("Error reading index alias for %s, keeping %s: %s", index_name, previous, e)
+            alias = previous
+        if alias.get("index", index_name) != previous.get("index", index_name):
+            logger.info("Index %s now served by %s", index_name, alias.get("index", index_name))
+        if alias.get("version") != previous.get("version"):
+            logger.info("Index %s version is now %s", index_name, alias.get("version"))
+        _aliases[index_name] = (now, alias)
+        return alias
+    finally:
+        _alias_lock.release()
+
+
+def resolve_index_name(index_name):
+    """
+    Get the Pinecone index currently serving a logical index name
+
+    Args:
+        index_name (str): Logical index name, e.g. "apartments-search"
+
+    Returns:
+        str: The versioned index the alias record in Pinecone points at, or
+        index_name itself if it has none (or the vector store is local)
+    """
+    return _read_alias(index_name).get("index") or index_name
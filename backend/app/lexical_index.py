@@ -0,0 +1,283 @@
+import os
+import logging
+import json
+import re
+import threading
+import time
+
+import numpy as np
+
+from app.atomic_files import build_lock, write_atomically
+from app.catalog import derive_filters
+from app.vector_store import VectorMatch, compile_filter, matches_filter
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# On-disk layout of the index directory:
+#   vocab.json          {term: term id}
+#   offsets.npy         int64, postings of term t are rows offsets[t]:offsets[t + 1]
+#   postings_docs.npy   int32 document numbers, grouped by term
+#   postings_tf.npy     float32 term frequencies, aligned with postings_docs
+#   doc_lengths.npy     float32 token count per document
+#   meta.json           apartment ids per document number, source signatures, avgdl
+# The arrays are memory-mapped on load; meta.json is written last.
+META_FILE = "meta.json"
+ARRAY_FILES = ("offsets.npy", "postings_docs.npy", "postings_tf.npy", "doc_lengths.npy")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the to with".split()
+)
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens of text, without stopwords"""
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _flatten_text(value, out):
+    # amenities/breadcrumbs may be strings, lists or nested dicts
+    if isinstance(value, str):
+        out.append(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _flatten_text(item, out)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _flatten_text(item, out)
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+    except OSError:
+        return None
+
+
+def _load_captions(path):
+    """Map apartment id -> generated image captions, if the captions file exists"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        apartments = json.load(f)
+    return {
+        apartment["id"]: [image.get("description", "") for image in apartment.get("images", [])]
+        for apartment in apartments
+        if "id" in apartment
+    }
+
+
+def document_text(apartment, captions=()):
+    """
+    Text of an apartment that the lexical index searches
+
+    Args:
+        apartment (dict): A raw apartment record
+        captions (list, optional): Generated captions of the apartment's images
+
+    Returns:
+        str: Name, location, description, amenities, breadcrumbs and captions
+    """
+    parts = []
+    for field in ("propertyName", "location", "description", "amenities", "breadcrumbs"):
+        _flatten_text(apartment.get(field), parts)
+    parts.extend(captions)
+    return " ".join(parts)
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the apartment catalog.
+
+    Postings are stored as flat NumPy arrays (CSR layout) and memory-mapped,
+    so a query costs one slice per query term plus a bincount over the
+    matching postings. The index is rebuilt and saved whenever the catalog
+    or the captions file changes.
+    """
+
+    def __init__(self, catalog, directory, captions_file=None):
+        self.catalog = catalog
+        self.directory = directory
+        self.captions_file = captions_file
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _sources(self):
+        return {
+            "catalog": list(self.catalog.version),
+            "captions": _file_signature(self.captions_file) if self.captions_file else None,
+        }
+
+    def _load(self, sources):
+        meta_path = os.path.join(self.directory, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta.get("sources") != sources:
+            return None
+        with open(os.path.join(self.directory, "vocab.json"), "r") as f:
+            vocab = json.load(f)
+        arrays = [np.load(os.path.join(self.directory, name), mmap_mode="r") for name in ARRAY_FILES]
+        return self._make_state(meta, vocab, *arrays)
+
+    def _make_state(self, meta, vocab, offsets, docs, tfs, doc_lengths):
+        filters = [derive_filters(self.catalog.get(doc_id) or {}) for doc_id in meta["doc_ids"]]
+        return {
+            "sources": meta["sources"],
+            "doc_ids": meta["doc_ids"],
+            "filters": filters,
+            "avgdl": meta["avgdl"],
+            "vocab": vocab,
+            "offsets": offsets,
+            "docs": docs,
+            "tfs": tfs,
+            # Precompute the per-document part of the BM25 denominator
+            "length_norm": (BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / meta["avgdl"])).astype(np.float32),
+        }
+
+    def _build(self, sources):
+        start = time.perf_counter()
+        captions = _load_captions(self.captions_file)
+        doc_ids = []
+        postings = {}
+        doc_lengths = []
+        for apartment in self.catalog.all():
+            apartment_id = apartment.get("id")
+            if apartment_id is None:
+                continue
+            doc = len(doc_ids)
+            doc_ids.append(apartment_id)
+            tokens = tokenize(document_text(apartment, captions.get(apartment_id, ())))
+            doc_lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((doc, count))
+
+        vocab = {}
+        offsets = [0]
+        docs = []
+        tfs = []
+        for term_id, (token, entries) in enumerate(sorted(postings.items())):
+            vocab[token] = term_id
+            docs.extend(doc for doc, _ in entries)
+            tfs.extend(count for _, count in entries)
+            offsets.append(len(docs))
+
+        offsets = np.asarray(offsets, dtype=np.int64)
+        docs = np.asarray(docs, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        avgdl = float(doc_lengths.mean()) if len(doc_lengths) and doc_lengths.mean() > 0 else 1.0
+        meta = {"sources": sources, "doc_ids": doc_ids, "avgdl": avgdl}
+
+        os.makedirs(self.directory, exist_ok=True)
+        for name, array in zip(ARRAY_FILES, (offsets, docs, tfs, doc_lengths)):
+            write_atomically(os.path.join(self.directory, name), lambda f: np.save(f, array))
+        for name, payload in (("vocab.json", vocab), (META_FILE, meta)):
+            write_atomically(os.path.join(self.directory, name), lambda f: json.dump(payload, f), mode="w")
+
+        logger.info(
+            "Built lexical index: %d documents, %d terms, %d postings in %.2fs",
+            len(doc_ids),
+            len(vocab),
+            len(docs),
+            time.perf_counter() - start,
+        )
+        return self._make_state(meta, vocab, offsets, docs, tfs, doc_lengths)
+
+    def _current(self):
+        sources = self._sources()
+        state = self._state
+        if state is not None and state["sources"] == sources:
+            return state
+        with self._lock:
+            if self._state is None or self._state["sources"] != sources:
+                self._state = self._load(sources) or self._load_or_build(sources)
+            return self._state
+
+    def _load_or_build(self, sources):
+        # Workers starting together queue on the lock; the first one builds
+        # and the rest load what it wrote
+        with build_lock(self.directory):
+            return self._load(sources) or self._build(sources)
+
+    def search(self, query, top_k=50, filter_dict=None):
+        """
+        Rank apartments by BM25 score for the query
+
+        Args:
+            query (str): The text query
+            top_k (int, optional): Number of matches to return. Defaults to 50.
+            filter_dict (dict, optional): Pinecone-style filter on the derived
+                bedrooms/bathrooms/price fields. Defaults to None.
+
+        Returns:
+            list: VectorMatch objects with the BM25 score, best first
+        """
+        state = self._current()
+        term_ids = {state["vocab"][t] for t in tokenize(query) if t in state["vocab"]}
+        doc_count = len(state["doc_ids"])
+        if not term_ids or doc_count == 0:
+            return []
+
+        offsets = state["offsets"]
+        doc_parts = []
+        weight_parts = []
+        for term_id in term_ids:
+            start, stop = offsets[term_id], offsets[term_id + 1]
+            docs = state["docs"][start:stop]
+            tfs = state["tfs"][start:stop]
+            df = stop - start
+            idf = np.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            doc_parts.append(docs)
+            weight_parts.append(idf * tfs * (BM25_K1 + 1) / (tfs + state["length_norm"][docs]))
+        scores = np.bincount(
+            np.concatenate(doc_parts), weights=np.concatenate(weight_parts), minlength=doc_count
+        )
+
+        candidates = np.flatnonzero(scores)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        if filter_dict:
+            filter_dict = compile_filter(filter_dict)
+        matches = []
+        for doc in candidates:
+            metadata = {"apartment_id": state["doc_ids"][doc], **state["filters"][doc]}
+            if filter_dict and not matches_filter(metadata, filter_dict):
+                continue
+            matches.append(VectorMatch(state["doc_ids"][doc], float(scores[doc]), metadata))
+            if len(matches) >= top_k:
+                break
+        return matches
+
+
+def reciprocal_rank_fusion(result_lists, k=60):
+    """
+    Merge ranked result lists with reciprocal rank fusion
+
+    Args:
+        result_lists (list): Lists of result dicts with "id", "score" and "metadata", best first
+        k (int, optional): RRF damping constant. Defaults to 60.
+
+    Returns:
+        list: Result dicts ordered by fused score, with "score" set to the fused score
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            entry = fused.get(result["id"])
+            if entry is None:
+                entry = fused[result["id"]] = {
+                    "id": result["id"],
+                    "score": 0.0,
+                    "metadata": result["metadata"],
+                }
+            entry["score"] += 1.0 / (k + rank + 1)
+    return sorted(fused.values(), key=lambda r: r["score"], reverse=True)
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import logging
+import logging.handlers
+import atexit
+import contextvars
+from contextlib import contextmanager
+from app import metrics
+
+# Logging for the backend. Records from the "app" loggers are put on an
+# in-memory queue by the request thread and written to stdout by a background
+# listener thread, so a slow or blocked stdout never stalls a request.
+#
+#   LOG_LEVEL        DEBUG, INFO (default), WARNING or ERROR. Full request
+#                    parameters and result payloads are only logged at DEBUG.
+#   LOG_FORMAT       "json" (default, one object per line) or "text"
+#   LOG_SAMPLE_RATE  Fraction of per-request access records to keep (default 1.0);
+#                    warnings and errors are never sampled out
+#   LOG_QUEUE_SIZE   Records buffered for the writer thread before new ones are dropped
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Fields of the request being handled: request_id, stage timings and
+# anything views add with set_request_field
+_request_fields = contextvars.ContextVar("request_fields", default=None)
+
+_queue_handler = None
+_listener = None
+
+
+def start_request(request_id=None):
+    """
+    Begin collecting per-request log fields in the current context
+
+    Args:
+        request_id (str, optional): Incoming X-Request-ID. A new id is generated if None.
+
+    Returns:
+        dict: The request's fields
+    """
+    fields = {"request_id": request_id or uuid.uuid4().hex, "stages_ms": {}}
+    _request_fields.set(fields)
+    return fields
+
+
+def current_request_fields():
+    """The current request's fields, or None outside a request"""
+    return _request_fields.get()
+
+
+def set_request_field(key, value):
+    """Attach a field (e.g. result_count) to the current request's access record"""
+    fields = _request_fields.get()
+    if fields is not None:
+        fields[key] = value
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a stage of the current request. The duration is added to the
+    request's access record (repeated stages add up) and to the stage's
+    latency histogram in app.metrics.
+
+    Args:
+        name (str): Stage name, e.g. "embedding" or "vector_query"
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("stage_duration_seconds", elapsed, stage=name)
+        fields = _request_fields.get()
+        if fields is not None:
+            stages = fields["stages_ms"]
+            stages[name] = round(stages.get(name, 0.0) + elapsed * 1000, 3)
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the current request id to every record"""
+
+    def filter(self, record):
+        fields = _request_fields.get()
+        record.request_id = fields["request_id"] if fields is not None else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps LOG_SAMPLE_RATE of records logged with extra={"sampled": True}"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not getattr(record, "sampled", False) or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the record's extra={"fields": {...}} merged in"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable records for local development"""
+
+    def format(self, record):
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()}"
+        if getattr(record, "request_id", None):
+            line += f" request_id={record.request_id}"
+        for key, value in (getattr(record, "fields", None) or {}).items():
+            line += f" {key}={value}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    dropped = 0
+
+    def prepare(self, record):
+        # Render the message and traceback here, while the arguments are
+        # still valid, but leave the structured formatting to the writer thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Drop rather than block the request when the writer falls behind
+            _NonBlockingQueueHandler.dropped += 1
+
+
+def _start_listener():
+    global _listener
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    _queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, handler)
+    _listener.start()
+
+
+def _stop_listener():
+    # Flush records still queued at interpreter exit
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def configure_logging():
+    """Route the "app" loggers through the queue handler; safe to call more than once"""
+    global _queue_handler
+    if _queue_handler is not None:
+        return
+    _queue_handler = _NonBlockingQueueHandler(None)
+    _queue_handler.addFilter(RequestContextFilter())
+    _queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    logger.handlers = [_queue_handler]
+    logger.propagate = False
+    _start_listener()
+    atexit.register(_stop_listener)
+
+
+def reset_after_fork():
+    """
+    Give a forked worker its own queue and writer thread. Threads don't
+    survive fork, and the parent's queue may have been locked mid-operation.
+    """
+    if _queue_handler is not None:
+        _start_listener()
+
+
+def dropped_records():
+    """Number of records dropped because the queue was full"""
+    return _NonBlockingQueueHandler.dropped
@@ -0,0 +1,183 @@
+import os
+import bisect
+import threading
+
+# In-process latency histograms and event counters, exported by /api/metrics
+# in the Prometheus text format (or as JSON with p50/p95/p99 estimates).
+# Recording is a bisect and a few additions under a lock; METRICS_ENABLED=false
+# turns it into a no-op. Each gunicorn worker keeps its own numbers.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRIC_PREFIX = "vibesearch_"
+
+# Upper bounds in seconds, from sub-millisecond cache hits to slow vision calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+FAMILIES = {
+    "stage_duration_seconds": ("histogram", "Time spent in each stage of handling a request"),
+    "http_request_duration_seconds": ("histogram", "Time from request start until the view returned"),
+    "http_requests_total": ("counter", "Requests handled, by endpoint and status"),
+    "upstream_errors_total": ("counter", "Failed calls to the embedding model, OpenAI or a vector store"),
+    "fallbacks_total": ("counter", "Times a degraded path was taken instead of the primary one"),
+    "upstream_rejections_total": ("counter", "Async calls refused because an upstream's concurrency limit stayed full"),
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+# (name, labels) -> [bucket counts..., +Inf count], sum, count
+_histograms = {}
+# (name, labels) -> value
+_counters = {}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """
+    Record a duration in a histogram
+
+    Args:
+        name (str): Histogram name from FAMILIES, e.g. "stage_duration_seconds"
+        value (float): The observed value in seconds
+        **labels: Label values, e.g. stage="embedding"
+    """
+    if not METRICS_ENABLED:
+        return
+    bucket = bisect.bisect_left(LATENCY_BUCKETS, value)
+    key = (name, _labels_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+        histogram[0][bucket] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def increment(name, amount=1, **labels):
+    """
+    Increase a counter
+
+    Args:
+        name (str): Counter name from FAMILIES, e.g. "fallbacks_total"
+        amount (int, optional): How much to add. Defaults to 1.
+        **labels: Label values, e.g. kind="vision_text_only"
+    """
+    if not METRICS_ENABLED:
+        return
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def _quantile(q, bucket_counts, count):
+    # Linear interpolation inside the bucket holding the q-th observation,
+    # as Prometheus' histogram_quantile does
+    if count == 0:
+        return None
+    rank = q * count
+    cumulative = 0
+    for i, bucket_count in enumerate(bucket_counts):
+        if cumulative + bucket_count >= rank and bucket_count:
+            if i == len(LATENCY_BUCKETS):
+                return LATENCY_BUCKETS[-1]
+            lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+            return lower + (LATENCY_BUCKETS[i] - lower) * (rank - cumulative) / bucket_count
+        cumulative += bucket_count
+    return LATENCY_BUCKETS[-1]
+
+
+def _snapshot():
+    with _lock:
+        histograms = {key: (list(h[0]), h[1], h[2]) for key, h in _histograms.items()}
+        counters = dict(_counters)
+    return histograms, counters
+
+
+def summary():
+    """
+    Get the histograms and counters as JSON-friendly dicts
+
+    Returns:
+        dict: {"histograms": {name: [{labels, count, sum, p50, p95, p99}]},
+        "counters": {name: [{labels, value}]}}
+    """
+    histograms, counters = _snapshot()
+    result = {"histograms": {}, "counters": {}}
+    for (name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+        entry = {"labels": dict(labels), "count": count, "sum": round(total, 6)}
+        for q in QUANTILES:
+            value = _quantile(q, bucket_counts, count)
+            entry[f"p{int(q * 100)}"] = round(value, 6) if value is not None else None
+        result["histograms"].setdefault(name, []).append(entry)
+    for (name, labels), value in sorted(counters.items()):
+        result["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+    return result
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(gauges=()):
+    """
+    Render every metric in the Prometheus text exposition format
+
+    Args:
+        gauges (iterable, optional): Extra (name, labels dict, value, help)
+            tuples sampled at scrape time, e.g. cache sizes. Defaults to ().
+
+    Returns:
+        str: The exposition text
+    """
+    histograms, counters = _snapshot()
+    lines = []
+    written = set()
+
+    def header(name, kind, help_text):
+        if name not in written:
+            written.add(name)
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+
+    for (name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+        header(name, *FAMILIES.get(name, ("histogram", name)))
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), bucket_counts):
+            cumulative += bucket_count
+            bucket_labels = labels + (("le", bound if bound == "+Inf" else repr(bound)),)
+            lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{METRIC_PREFIX}{name}_sum{_format_labels(labels)} {total!r}")
+        lines.append(f"{METRIC_PREFIX}{name}_count{_format_labels(labels)} {count}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, *FAMILIES.get(name, ("counter", name)))
+        lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {value}")
+
+    for name, labels, value, help_text in sorted(gauges, key=lambda gauge: gauge[0]):
+        header(name, "gauge", help_text)
+        lines.append(f"{METRIC_PREFIX}{name}{_format_labels(_labels_key(labels))} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Forget every recorded value"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
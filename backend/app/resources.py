@@ -0,0 +1,249 @@
+import os
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Heavy clients are created on first use and then shared by every request in
+# the process. Importing this module is cheap, so /api/health can answer as
+# soon as the worker boots.
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Connection pool settings for the long-lived HTTP clients
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "4"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# Seconds a missing image embedding export is remembered before
+# IMAGE_EMBEDDINGS_DIR is checked again
+IMAGE_EMBEDDINGS_RECHECK_SECONDS = float(os.getenv("IMAGE_EMBEDDINGS_RECHECK_SECONDS", "60"))
+
+_PROCESS_START = time.time()
+
+_lock = threading.RLock()
+_resources = {}
+# Monotonic time until which get_image_embeddings answers None without looking
+_image_embeddings_absent_until = 0.0
+
+# Per-kind counts of lookups served by an existing handle (hits) versus ones
+# that had to build a new handle (misses)
+_stats_lock = threading.Lock()
+_pool_stats = {}
+
+
+def _record(kind, outcome):
+    with _stats_lock:
+        counts = _pool_stats.setdefault(kind, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+
+def _get_or_create(key, factory):
+    kind = key[0] if isinstance(key, tuple) else key
+    resource = _resources.get(key)
+    if resource is not None:
+        _record(kind, "hits")
+        return resource
+    with _lock:
+        resource = _resources.get(key)
+        if resource is None:
+            resource = factory()
+            _resources[key] = resource
+            _record(kind, "misses")
+        else:
+            _record(kind, "hits")
+    return resource
+
+
+def pool_stats():
+    """
+    Get hit/miss counters for the shared clients and index handles
+
+    Returns:
+        dict: {kind: {"hits": int, "misses": int}} since process start
+    """
+    with _stats_lock:
+        return {kind: dict(counts) for kind, counts in _pool_stats.items()}
+
+
+def _create_embedding_model():
+    from sentence_transformers import SentenceTransformer
+
+    start = time.perf_counter()
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    logger.info("Loaded embedding model %s in %.2fs", EMBEDDING_MODEL_NAME, time.perf_counter() - start)
+    return model
+
+
+def _create_pinecone_client():
+    from pinecone import Pinecone
+
+    api_key = os.getenv("PINECONE_API_KEY")
+    if not api_key:
+        raise ValueError("PINECONE_API_KEY not found in environment variables")
+    # pool_threads sizes the thread pool and urllib3 connection pool that
+    # index handles created from this client reuse across requests
+    return Pinecone(api_key=api_key, pool_threads=PINECONE_POOL_THREADS)
+
+
+def _create_openai_client():
+    import httpx
+    import openai
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables")
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=OPENAI_TIMEOUT,
+    )
+    return openai.OpenAI(api_key=api_key, http_client=http_client)
+
+
+def get_embedding_model():
+    """Get the process-wide SentenceTransformer model, loading it on first use"""
+    return _get_or_create("embedding_model", _create_embedding_model)
+
+
+def get_pinecone_client():
+    """Get the process-wide Pinecone client"""
+    return _get_or_create("pinecone", _create_pinecone_client)
+
+
+def get_index(index_name):
+    """
+    Get a long-lived handle to a Pinecone index
+
+    Args:
+        index_name (str): The name of the Pinecone index
+
+    Returns:
+        pinecone.Index: A handle shared by every caller in this process
+    """
+    return _get_or_create(
+        ("index", index_name),
+        lambda: get_pinecone_client().Index(index_name, pool_threads=PINECONE_POOL_THREADS),
+    )
+
+
+def get_vector_store(index_name):
+    """
+    Get the vector store serving an index, using the VECTOR_STORE_BACKEND
+    configured for this process
+
+    Args:
+        index_name (str): Logical index name, e.g. "apartments-search"
+
+    Returns:
+        app.vector_store.VectorStore: The store shared by every caller in this process
+    """
+    from app.vector_store import create_vector_store
+
+    return _get_or_create(("vector_store", index_name), lambda: create_vector_store(index_name))
+
+
+def get_image_embeddings():
+    """
+    Get the local per-apartment image embedding matrix
+
+    Returns:
+        app.image_embeddings.ImageEmbeddingMatrix: The matrix, or None until
+        one has been exported to IMAGE_EMBEDDINGS_DIR
+    """
+    global _image_embeddings_absent_until
+    from app.image_embeddings import load_image_embeddings
+
+    # Remember a missing export for a while so previews don't all queue on
+    # the registry lock to look for it again. No handle is served, so the
+    # lookup still counts as a miss
+    if _resources.get("image_embeddings") is None and time.monotonic() < _image_embeddings_absent_until:
+        _record("image_embeddings", "misses")
+        return None
+    embeddings = _get_or_create("image_embeddings", load_image_embeddings)
+    if embeddings is None:
+        _image_embeddings_absent_until = time.monotonic() + IMAGE_EMBEDDINGS_RECHECK_SECONDS
+    return embeddings
+
+
+def get_openai_client():
+    """Get the process-wide OpenAI client"""
+    return _get_or_create("openai", _create_openai_client)
+
+
+def install(key, resource):
+    """
+    Replace a shared resource, e.g. with an in-process stand-in for a benchmark
+
+    Args:
+        key: The resource key: "embedding_model", "pinecone", "openai",
+            ("index", name) or ("vector_store", name)
+        resource: The object later getters should return
+    """
+    with _lock:
+        _resources[key] = resource
+
+
+def preload():
+    """
+    Load the embedding model eagerly.
+
+    Meant to run in the gunicorn master when preload_app is on, so forked
+    workers share the model's weights through copy-on-write pages instead of
+    each loading their own copy. Only the model is loaded here: network
+    clients hold sockets and threads that must not be shared across a fork,
+    and no inference is run so torch's thread pools are not started before
+    forking.
+    """
+    get_embedding_model()
+
+
+def reset_after_fork():
+    """Drop per-process network clients inherited from a preloading parent"""
+    with _lock:
+        for key in list(_resources):
+            if key != "embedding_model":
+                del _resources[key]
+
+
+def current_rss_mb():
+    """
+    Resident set size of this process in MB
+
+    Returns:
+        float: Current RSS on Linux, peak RSS elsewhere
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux
+        divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return max_rss / divisor
+
+
+def report_startup(label):
+    """
+    Log time since process start and current RSS
+
+    Args:
+        label (str): What just finished booting, e.g. "app" or "worker"
+    """
+    logger.info(
+        "%s ready (pid %d): startup %.2fs, RSS %.1f MB",
+        label,
+        os.getpid(),
+        time.time() - _PROCESS_START,
+        current_rss_mb(),
+    )
@@ -0,0 +1,228 @@
+import os
+import json
+import zlib
+
+from flask import Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from app.logging_config import stage
+
+# orjson and brotli are optional: without them responses fall back to the
+# standard library encoder and to gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+# Streamed output is buffered into chunks of about this size; the first
+# item is always sent on its own so it reaches the client right away
+STREAM_CHUNK_BYTES = int(os.getenv("STREAM_CHUNK_BYTES", "16384"))
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/x-ndjson")
+
+
+def dumps_bytes(obj, sort_keys=False):
+    """
+    Serialize an object to compact JSON bytes, with orjson when it is installed
+
+    Args:
+        obj: The object to serialize
+        sort_keys (bool, optional): Sort object keys. Defaults to False.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=option)
+    return json.dumps(
+        obj,
+        default=DefaultJSONProvider.default,
+        separators=(",", ":"),
+        sort_keys=sort_keys,
+        ensure_ascii=False,
+    ).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes jsonify() responses with orjson when available"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.get("indent"):
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj, sort_keys=self.sort_keys).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        with stage("serialize"):
+            body = dumps_bytes(obj, sort_keys=self.sort_keys) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def _buffered(pieces):
+    buffer = []
+    size = 0
+    first = True
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if first or size >= STREAM_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+            first = False
+    if buffer:
+        yield b"".join(buffer)
+
+
+def stream_results(results, extra=None, ndjson=False, with_context=True):
+    """
+    Build a streamed response for a list or iterator of search results
+
+    Args:
+        results (iterable): Result dicts, serialized as they are produced
+        extra (dict, optional): Other top-level fields, e.g. next_cursor. Defaults to None.
+        ndjson (bool, optional): Emit one JSON document per line (each result,
+            then extra if given) instead of a chunked {"results": [...]} object.
+            Defaults to False.
+        with_context (bool, optional): Keep the request context alive while the
+            body is generated. Async views must pass False and hand over results
+            that need no context: the context an async view runs in can't be
+            re-entered from the generator. Defaults to True.
+
+    Returns:
+        Response: A chunked application/json or application/x-ndjson response
+    """
+
+    def generate():
+        if ndjson:
+            for result in results:
+                yield dumps_bytes(result) + b"\n"
+            if extra:
+                yield dumps_bytes(extra) + b"\n"
+            return
+
+        yield b'{"results":['
+        for i, result in enumerate(results):
+            yield (b"," if i else b"") + dumps_bytes(result)
+        yield b"]"
+        for key, value in (extra or {}).items():
+            yield b"," + dumps_bytes(key) + b":" + dumps_bytes(value)
+        yield b"}\n"
+
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    body = _buffered(generate())
+    if with_context:
+        body = stream_with_context(body)
+    return Response(body, mimetype=mimetype)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the response compression for an Accept-Encoding header
+
+    Args:
+        accept_encoding (str): The request's Accept-Encoding header
+
+    Returns:
+        str: "br", "gzip" or None
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+
+def _compressor(encoding):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return (
+        compressor.compress,
+        lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+def _compress_stream(chunks, encoding):
+    process, flush, finish = _compressor(encoding)
+    try:
+        for chunk in chunks:
+            # Flush after every chunk so the client can decode it immediately
+            data = process(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def compress_response(response, accept_encoding):
+    """
+    Compress a JSON/NDJSON response as negotiated by Accept-Encoding. Streamed
+    responses are compressed chunk by chunk as they are generated.
+
+    Args:
+        response (Response): The outgoing response
+        accept_encoding (str): The request's Accept-Encoding header
+
+    Returns:
+        Response: The same response, compressed if worthwhile
+    """
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 304)
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESSION_MIN_BYTES:
+            return response
+        process, _, finish = _compressor(encoding)
+        with stage("compress"):
+            response.set_data(process(body) + finish())
+    response.headers["Content-Encoding"] = encoding
+    return response
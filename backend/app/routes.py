@@ -1,13 +1,205 @@
 from flask import Blueprint, request, jsonify
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+from app.logging_config import set_request_field
+from app.responses import stream_results
 from app.services import (
     search_apartments,
+    search_apartments_paginated,
+    CursorExpiredError,
+    HYBRID_SEARCH,
+    InvalidCursorError,
+    TooManyCandidatesError,
+    geo_candidate_ids,
+    restrict_to_ids,
+    attach_previews_to_results,
+    iter_results_with_previews,
     get_apartment_preview_by_id,
+    get_apartment_previews_by_ids,
     get_apartment_details_by_id,
 )
-import traceback
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 search_bp = Blueprint("search", __name__)
 
+# Upper bound on the number of apartments a single batch preview request may ask for
+MAX_BATCH_PREVIEW_IDS = 100
+# Larger limits are capped to this; Pinecone returns at most 1000 matches with metadata
+MAX_SEARCH_LIMIT = 1000
+
+
+def parse_search_args(args, accept=""):
+    """
+    Parse and validate the query string of a search request
+
+    Args:
+        args (MultiDict): The request's query parameters
+        accept (str, optional): The request's Accept header, which asks for an
+            NDJSON stream when it lists application/x-ndjson. Defaults to "".
+
+    Returns:
+        tuple: (params dict with query, image_urls, top_k, filter_dict, include,
+        paginate, cursor, hybrid and stream, None) on success, or
+        (None, error message) if the request is invalid
+    """
+    logger.debug("Search parameters: %s", dict(args))
+    query = args.get("query", "")
+
+    image_urls_json = args.get("imageUrls")
+    image_urls = []
+    if image_urls_json:
+        try:
+            image_urls = json.loads(image_urls_json)
+        except json.JSONDecodeError as e:
+            logger.warning("Failed to parse image URLs: %.100s..., error: %s", image_urls_json, e)
+        # Anything but a list of URL strings is ignored, like unparseable JSON
+        if not isinstance(image_urls, list) or not all(isinstance(url, str) for url in image_urls):
+            logger.warning("Ignoring image URLs that are not a list of strings: %.100s...", image_urls_json)
+            image_urls = []
+        logger.debug("Received %d image URLs", len(image_urls))
+    
+    cursor = args.get("cursor")
+    if not query.strip() and not image_urls and not cursor:
+        logger.info("No query or image URLs provided")
+        return None, "Query parameter or image URLs are required"
+
+    # Get optional parameters
+    top_k = args.get("limit", default=50, type=int)
+    if top_k <= 0:
+        return None, "limit must be a positive integer"
+    top_k = min(top_k, MAX_SEARCH_LIMIT)
+
+    filter_dict = {}
+    min_price = args.get("min_price", type=float)
+    max_price = args.get("max_price", type=float)
+    min_bedrooms = args.get("min_bedrooms", type=float)
+    max_bedrooms = args.get("max_bedrooms", type=float)
+    min_bathrooms = args.get("min_bathrooms", type=float)
+    max_bathrooms = args.get("max_bathrooms", type=float)
+    
+    if min_price is not None:
+        filter_dict["price_min"] = {
+            "$gte": min_price
+        }
+    if max_price is not None:
+        filter_dict["price_max"] = {
+            "$lte": max_price
+        }
+    if min_bedrooms is not None or max_bedrooms is not None:
+        filter_dict["bedrooms"] = {
+            "$gte": min_bedrooms if min_bedrooms is not None else 0,
+            "$lte": max_bedrooms if max_bedrooms is not None else float('9999')
+        }
+    if min_bathrooms is not None or max_bathrooms is not None:
+        filter_dict["bathrooms"] = {
+            "$gte": min_bathrooms if min_bathrooms is not None else 0,
+            "$lte": max_bathrooms if max_bathrooms is not None else float('9999')
+        }
+    if not filter_dict:
+        filter_dict = None
+
+    # Location filters: a radius around lat/lng and/or a bounding box
+    lat = args.get("lat", type=float)
+    lng = args.get("lng", type=float)
+    radius_km = args.get("radius_km", type=float)
+    bbox = [args.get(name, type=float) for name in ("min_lat", "min_lng", "max_lat", "max_lng")]
+    if any(value is not None for value in (lat, lng, radius_km)):
+        if lat is None or lng is None or radius_km is None:
+            return None, "lat, lng and radius_km must be given together"
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or radius_km <= 0:
+            return None, "lat/lng must be valid coordinates and radius_km positive"
+    if any(value is not None for value in bbox):
+        if any(value is None for value in bbox):
+            return None, "min_lat, min_lng, max_lat and max_lng must be given together"
+        if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            return None, "min_lat/min_lng must not exceed max_lat/max_lng"
+    else:
+        bbox = None
+    if (radius_km is not None or bbox is not None) and not cursor:
+        try:
+            apartment_ids = geo_candidate_ids(lat, lng, radius_km, bbox)
+        except TooManyCandidatesError as e:
+            return None, str(e)
+        logger.debug("Location filter matched %d apartments", len(apartment_ids))
+        filter_dict = restrict_to_ids(filter_dict, apartment_ids)
+
+    include = {part.strip() for part in args.get("include", "").split(",")}
+    paginate = bool(cursor) or args.get("paginate", "").lower() in ("1", "true", "yes")
+    hybrid = args.get("hybrid")
+    hybrid = HYBRID_SEARCH if hybrid is None else hybrid.lower() in ("1", "true", "yes")
+
+    stream = args.get("stream", "").lower()
+    if stream in ("1", "true", "yes", "json"):
+        stream = "json"
+    elif stream == "ndjson" or (not stream and "application/x-ndjson" in parse_accept_header(accept, MIMEAccept)):
+        stream = "ndjson"
+    elif stream in ("", "0", "false", "no"):
+        stream = None
+    else:
+        return None, "stream must be json or ndjson"
+
+    return {
+        "query": query,
+        "image_urls": image_urls,
+        "top_k": top_k,
+        "filter_dict": filter_dict,
+        "include": include,
+        "paginate": paginate,
+        "cursor": cursor,
+        "hybrid": hybrid,
+        "stream": stream,
+    }, None
+
+
+def parse_previews_body(body):
+    """
+    Parse and validate the JSON body of a batch preview request
+
+    Args:
+        body: The decoded JSON body, or None
+
+    Returns:
+        tuple: (list of apartment IDs, query, None) on success, or
+        (None, None, error message) if the request is invalid
+    """
+    if body is None:
+        body = {}
+    if not isinstance(body, dict):
+        return None, None, "Request body must be a JSON object"
+    apartment_ids = body.get("ids")
+    if not isinstance(apartment_ids, list) or not all(
+        isinstance(apartment_id, str) for apartment_id in apartment_ids
+    ):
+        return None, None, "ids must be a list of apartment IDs"
+    if len(apartment_ids) > MAX_BATCH_PREVIEW_IDS:
+        return None, None, f"At most {MAX_BATCH_PREVIEW_IDS} ids can be requested at once"
+    query = body.get("query")
+    if query is not None and not isinstance(query, str):
+        return None, None, "query must be a string"
+    return apartment_ids, query or "", None
+
+
+def stream_search_response(params, results, extra=None):
+    """
+    Stream search results as they are serialized; with include=preview each
+    result is written as soon as its preview is built
+
+    Args:
+        params (dict): Parsed search parameters from parse_search_args
+        results (list): Search results
+        extra (dict, optional): Other top-level fields, e.g. next_cursor. Defaults to None.
+
+    Returns:
+        Response: A chunked JSON or NDJSON response
+    """
+    if "preview" in params["include"]:
+        results = iter_results_with_previews(results, params["query"])
+    return stream_results(results, extra, ndjson=params["stream"] == "ndjson")
+
+
 @search_bp.route("/api/search", methods=["GET"])
 def search():
     """
@@ -16,7 +208,19 @@ def search():
     Query Parameters:
         query (str, optional): Text search query to match against apartment descriptions
         imageUrls (str, optional): JSON string containing array of image URLs for visual search
-        limit (int, optional): Maximum number of results to return (default: 50)
+        limit (int, optional): Maximum number of results to return (default: 50,
+            capped at MAX_SEARCH_LIMIT)
+        include (str, optional): Comma-separated extras to inline; "preview" adds
+            each result's preview data so no follow-up preview calls are needed
+        paginate (bool, optional): Return the first page of a paginated search
+            (limit results) along with a next_cursor
+        cursor (str, optional): next_cursor from a previous page; returns the
+            following page of that search, ignoring query and filter parameters
+        hybrid (bool, optional): Fuse BM25 keyword matches with the vector results
+            (default: the HYBRID_SEARCH setting)
+        stream (str, optional): "json" streams the usual response body in chunks;
+            "ndjson" (also chosen by Accept: application/x-ndjson) streams one
+            result per line, followed by a {"next_cursor": ...} line when paginating
         
     Filter Parameters:
         min_price (float, optional): Minimum price filter
@@ -25,76 +229,58 @@ def search():
         max_bedrooms (float, optional): Maximum number of bedrooms
         min_bathrooms (float, optional): Minimum number of bathrooms
         max_bathrooms (float, optional): Maximum number of bathrooms
+        lat, lng, radius_km (float, optional): Only apartments within radius_km of lat/lng
+        min_lat, min_lng, max_lat, max_lng (float, optional): Only apartments inside this box
         
     Returns:
         JSON response containing:
             - results: Array of matching apartment objects
+            - next_cursor: Cursor for the next page (paginated searches only)
             - error: Error message if something went wrong
             
     Example:
         GET /api/search?query=modern&min_price=1000&max_price=3000&min_bedrooms=2
     """
     try:
-        print(f"DEBUG: Request parameters: {dict(request.args)}")
-        query = request.args.get("query", "")
+        params, error = parse_search_args(request.args, request.headers.get("Accept", ""))
+        if error:
+            return jsonify({"error": error}), 400
 
-        image_urls_json = request.args.get("imageUrls")
-        image_urls = []
-        if image_urls_json:
-            try:
-                import json
-                image_urls = json.loads(image_urls_json)
-                print(f"DEBUG: Received {len(image_urls)} image URLs")
-            except json.JSONDecodeError as e:
-                print(f"ERROR: Failed to parse image URLs: {image_urls_json[:100]}..., error: {e}")
-            except Exception as e:
-                print(f"ERROR: Unexpected error handling image URLs: {e}")
-        
-        if not query.strip() and not image_urls:
-            print("ERROR: No query or image URLs provided")
-            return jsonify({"error": "Query parameter or image URLs are required"}), 400
-
-        # Get optional parameters
-        top_k = request.args.get("limit", default=50, type=int)
-
-        filter_dict = {}
-        min_price = request.args.get("min_price", type=float)
-        max_price = request.args.get("max_price", type=float)
-        min_bedrooms = request.args.get("min_bedrooms", type=float)
-        max_bedrooms = request.args.get("max_bedrooms", type=float)
-        min_bathrooms = request.args.get("min_bathrooms", type=float)
-        max_bathrooms = request.args.get("max_bathrooms", type=float)
-        
-        if min_price is not None:
-            filter_dict["price_min"] = {
-                "$gte": min_price
-            }
-        if max_price is not None:
-            filter_dict["price_max"] = {
-                "$lte": max_price
-            }
-        if min_bedrooms is not None or max_bedrooms is not None:
-            filter_dict["bedrooms"] = {
-                "$gte": min_bedrooms if min_bedrooms is not None else 0,
-                "$lte": max_bedrooms if max_bedrooms is not None else float('9999')
-            }
-        if min_bathrooms is not None or max_bathrooms is not None:
-            filter_dict["bathrooms"] = {
-                "$gte": min_bathrooms if min_bathrooms is not None else 0,
-                "$lte": max_bathrooms if max_bathrooms is not None else float('9999')
-            }
-        if not filter_dict:
-            filter_dict = None
-
-        results = search_apartments(query, filter_dict, top_k, image_urls)
-
-        print(f"DEBUG: Search completed, returned {len(results)} results")
-        print(f"DEBUG: Results: {results}")
-
-        return jsonify({"results": results})
+        response = {}
+        if params["paginate"]:
+            results, response["next_cursor"] = search_apartments_paginated(
+                params["query"],
+                params["filter_dict"],
+                params["top_k"],
+                params["image_urls"],
+                params["cursor"],
+                params["hybrid"],
+            )
+        else:
+            results = search_apartments(
+                params["query"],
+                params["filter_dict"],
+                params["top_k"],
+                params["image_urls"],
+                params["hybrid"],
+            )
+
+        set_request_field("result_count", len(results))
+        if params["stream"]:
+            return stream_search_response(params, results, response)
+
+        if "preview" in params["include"]:
+            results = attach_previews_to_results(results, params["query"])
+
+        response["results"] = results
+        return jsonify(response)
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
+    except CursorExpiredError as e:
+        return jsonify({"error": str(e)}), 410
     except Exception as e:
         error_message = f"Error in search endpoint: {str(e)}"
-        print(traceback.format_exc())
+        logger.exception("Error in search endpoint")
         return jsonify({"error": error_message}), 500
 
 
@@ -121,7 +307,34 @@ def apartment_preview(apartment_id):
         return jsonify({"apartment": apartment})
     except Exception as e:
         error_message = f"Error in apartment preview endpoint: {str(e)}"
-        print(traceback.format_exc())
+        logger.exception("Error in apartment preview endpoint")
+        return jsonify({"error": error_message}), 500
+
+
+@search_bp.route("/api/apartment/previews", methods=["POST"])
+def apartment_previews():
+    """
+    Get preview data for several apartments in one request, with optional query
+    to order each apartment's images by relevance to the query
+
+    JSON body:
+        ids (list[str]): The IDs of the apartments to retrieve preview data for
+        query (str, optional): The search query to rank images by relevance
+
+    Returns:
+        JSON: Previews in the same order as the requested IDs, plus the IDs that
+        were not found and those whose preview failed to build, or an error message
+    """
+    try:
+        apartment_ids, query, error = parse_previews_body(request.get_json(silent=True))
+        if error:
+            return jsonify({"error": error}), 400
+
+        apartments, missing, failed = get_apartment_previews_by_ids(apartment_ids, query)
+        return jsonify({"apartments": apartments, "missing": missing, "failed": failed})
+    except Exception as e:
+        error_message = f"Error in apartment previews endpoint: {str(e)}"
+        logger.exception("Error in apartment previews endpoint")
         return jsonify({"error": error_message}), 500
 
 
@@ -148,5 +361,5 @@ def apartment_details(apartment_id):
         return jsonify({"apartment": apartment})
     except Exception as e:
         error_message = f"Error in apartment details endpoint: {str(e)}"
-        print(traceback.format_exc())
+        logger.exception("Error in apartment details endpoint")
         return jsonify({"error": error_message}), 500
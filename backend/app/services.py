@@ -1,128 +1,679 @@
 import os
-import openai    
+import logging
+import base64
 import json
+import hashlib
 import time
-from functools import lru_cache
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
+from concurrent.futures import ThreadPoolExecutor
+from array import array
 from dotenv import load_dotenv
+from app.cache import create_cache
+from app.catalog import ApartmentCatalog
+from app.embedding_batcher import EmbeddingBatcher
+from app.filter_index import FilterIndex
+from app.index_version import get_index_version, resolve_index_name
+from app.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app import metrics
+from app.logging_config import stage
+from app.spatial_index import SpatialIndex
+from app.resources import (
+    get_embedding_model,
+    get_image_embeddings,
+    get_openai_client,
+    get_vector_store,
+)
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-if not PINECONE_API_KEY:
+if VECTOR_STORE_BACKEND == "pinecone" and not PINECONE_API_KEY:
     raise ValueError("PINECONE_API_KEY not found in environment variables")
-pc = Pinecone(api_key=PINECONE_API_KEY)
-image_index = pc.Index("apartment-images-search")
 
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2", device="cpu")
+# The embedding model, vector stores and Pinecone/OpenAI clients are created
+# lazily by app.resources on first use rather than at import time
 INDEX_NAME = "apartments-search"
-APARTMENTS_FILE = os.path.join(
-    os.path.dirname(os.path.dirname(__file__)), "apartments.json"
+IMAGE_INDEX_NAME = "apartment-images-search"
+APARTMENTS_FILE = os.getenv(
+    "APARTMENTS_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "apartments.json"),
+)
+catalog = ApartmentCatalog(APARTMENTS_FILE)
+# Price/bedroom/bathroom columns of the catalog for evaluating filters in bulk
+filter_index = FilterIndex(catalog)
+
+# Worker pool for ranking images of several apartments at once (batch previews)
+PREVIEW_RANKING_WORKERS = int(os.getenv("PREVIEW_RANKING_WORKERS", "8"))
+_preview_executor = ThreadPoolExecutor(
+    max_workers=PREVIEW_RANKING_WORKERS, thread_name_prefix="preview-ranking"
+)
+
+# Shared embedding cache in front of the model. Set EMBEDDING_CACHE_PATH to a
+# SQLite file to share warm entries between all worker processes on the host.
+_embedding_cache = create_cache(
+    "embedding",
+    maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("EMBEDDING_CACHE_TTL", "86400")),
+    shared_path=os.getenv("EMBEDDING_CACHE_PATH"),
+    dumps=lambda embedding: array("f", embedding).tobytes(),
+    loads=lambda raw: array("f", raw).tolist(),
+)
+
+
+# Optional micro-batching of concurrent embedding calls into one encode()
+EMBEDDING_BATCH_ENABLED = os.getenv("EMBEDDING_BATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+embedding_batcher = (
+    EmbeddingBatcher(
+        get_embedding_model,
+        max_batch_size=int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32")),
+        max_wait_ms=float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5")),
+    )
+    if EMBEDDING_BATCH_ENABLED
+    else None
 )
 
+
+def _normalize_embedding_text(text):
+    # all-MiniLM-L6-v2 uses an uncased tokenizer, so case and runs of
+    # whitespace don't change the embedding and can be folded into one key
+    return " ".join(text.lower().split())
+
+
 def create_embedding(text):
     """Create an embedding for the given text using sentence-transformers"""
     try:
-        embedding = model.encode(text)
-        return embedding.tolist()
+        key = _normalize_embedding_text(text)
+        embedding = _embedding_cache.get(key)
+        if embedding is not None:
+            return embedding
+        with stage("embedding"):
+            if embedding_batcher is not None:
+                embedding = embedding_batcher.encode(key)
+            else:
+                embedding = get_embedding_model().encode(key).tolist()
+        _embedding_cache.set(key, embedding)
+        return embedding
     except Exception as e:
-        print(f"Error creating embedding: {e}")
+        logger.error("Error creating embedding: %s", e)
+        metrics.increment("upstream_errors_total", upstream="embedding")
         return None
 
 
-@lru_cache(maxsize=128)
-def _get_query_embedding(query: str):
-    return create_embedding(query)
+# Persistent cache of gpt-4o image descriptions and their embeddings, so
+# re-running an image search (e.g. while adjusting price filters) skips the
+# vision call. Stored in SQLite so it survives restarts and is shared by workers.
+VISION_CACHE_PATH = os.getenv(
+    "VISION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "vision.sqlite"),
+)
+_vision_cache = create_cache(
+    "vision",
+    maxsize=int(os.getenv("VISION_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("VISION_CACHE_TTL", str(7 * 24 * 3600))),
+    shared_path=VISION_CACHE_PATH,
+)
+
+
+def _vision_cache_key(search_text, image_urls):
+    # Only the first 5 images are sent to the model; their order doesn't
+    # matter for the description, so key on the set
+    payload = json.dumps(
+        {
+            "images": sorted(set(image_urls[:5])),
+            "text": _normalize_embedding_text(search_text),
+        }
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
 
 
-def search_apartments(query, filter_dict=None, top_k=10, image_urls=None):
+def describe_images(search_text, image_urls):
     """
-    Search for apartments in the Pinecone index
+    Ask gpt-4o for a short search description of the images, combined with the
+    text query if there is one
+
+    Args:
+        search_text (str): The stripped text query, possibly empty
+        image_urls (list): Image URLs; only the first 5 are sent
+
+    Returns:
+        str: The generated description
+    """
+    client = get_openai_client()
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant that generates semantic search descriptions for apartment listings. Provide a concise description (less than 20 words) focusing on aesthetics and design elements visible in the images."}
+    ]
+    content = []
+    if search_text:
+        content.append(
+            {"type": "text", 
+             "text": f"These are images of apartment interiors/exteriors. Generate a 20-word search description that combines analyzing these images with the text query: '{search_text}'. Focus on aesthetics and design elements."}
+        )
+    else:
+        content.append(
+            {"type": "text", 
+             "text": "These are images of apartment interiors/exteriors. Generate a 20-word search description focusing on aesthetics and design elements visible in the images."}
+        )
+    for url in image_urls[:5]:
+        logger.debug("Adding image URL to content: %.60s...", url)
+        content.append(
+            {"type": "image_url", "image_url": {"url": url}}
+        )
+    messages.append({"role": "user", "content": content})
+    with stage("vision"):
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            max_tokens=100
+        )
+    return response.choices[0].message.content.strip()
+
+
+def build_search_embedding(query, image_urls, describe, embed, start_fallback=None):
+    """
+    Create the embedding a search runs with: the text query on its own, or a
+    gpt-4o description of the images combined with the text query. Shared by
+    the sync and async search paths, which pass their own upstream callables.
+
+    Args:
+        query (str): The search query
+        image_urls (list): List of image URLs to analyze, possibly empty
+        describe (callable): Called as describe(search_text, image_urls) for the image description
+        embed (callable): Called as embed(text) for an embedding, or None on failure
+        start_fallback (callable, optional): Called once the vision call is
+            needed; returns a zero-argument callable giving the text-only
+            embedding, so it can be computed while the vision call runs.
+            Defaults to None, embedding the text only if the vision call fails.
+
+    Returns:
+        list: The query embedding, or None if no usable query could be built
+    """
+    search_text = query.strip()
+    if not image_urls:
+        return embed(search_text)
+
+    vision_key = _vision_cache_key(search_text, image_urls)
+    cached = _vision_cache.get(vision_key)
+    if cached is not None:
+        logger.debug("Using cached image description: %s", cached["combined_query"])
+        return cached["embedding"]
+
+    if not os.getenv("OPENAI_API_KEY"):
+        logger.error("OPENAI_API_KEY not found in environment")
+        return None
+
+    logger.info("Processing %d image URLs for analysis", len(image_urls))
+    fallback = None
+    if search_text:
+        fallback = start_fallback() if start_fallback else lambda: embed(search_text)
+    try:
+        combined_query = describe(search_text, image_urls)
+        logger.debug("Combined query for embedding: %s", combined_query)
+        query_embedding = embed(combined_query)
+        if query_embedding is not None:
+            _vision_cache.set(
+                vision_key, {"combined_query": combined_query, "embedding": query_embedding}
+            )
+        return query_embedding
+    except Exception as api_error:
+        logger.error("Error during OpenAI API call: %s", api_error)
+        metrics.increment("upstream_errors_total", upstream="openai")
+        if fallback is None:
+            logger.warning("No fallback query available")
+            return None
+        logger.warning("Falling back to text-only query")
+        metrics.increment("fallbacks_total", kind="vision_text_only")
+        return fallback()
+
+
+def get_search_embedding(query, image_urls=None):
+    """
+    Create the embedding a search runs with, see build_search_embedding
+
+    Args:
+        query (str): The search query
+        image_urls (list, optional): List of image URLs to analyze. Defaults to None.
+
+    Returns:
+        list: The query embedding, or None if no usable query could be built
+    """
+    return build_search_embedding(query, image_urls, describe_images, create_embedding)
+
+
+# Cache of complete search results, keyed on everything that determines them.
+# Keys embed the index version stamp so a reindex invalidates every entry.
+_result_cache = create_cache(
+    "search_results",
+    maxsize=int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SEARCH_RESULT_CACHE_TTL", "300")),
+    shared_path=os.getenv("SEARCH_RESULT_CACHE_PATH"),
+)
+
+
+def search_result_cache_key(query, filter_dict, top_k, image_urls, hybrid=False):
+    """
+    Build the result cache key for a search
+
+    Args:
+        query (str): The search query
+        filter_dict (dict): Filter criteria for metadata, or None
+        top_k (int): Number of results requested
+        image_urls (list): Image URLs of the search, or None
+        hybrid (bool, optional): Whether lexical results are fused in. Defaults to False.
+
+    Returns:
+        str: A key that changes whenever the query, filters, top_k, images, mode, index
+        version or serving index do
+    """
+    payload = json.dumps(
+        {
+            "version": get_index_version(INDEX_NAME),
+            "index": resolve_index_name(INDEX_NAME),
+            "query": _normalize_embedding_text(query),
+            "filter": filter_dict,
+            "top_k": top_k,
+            "images": sorted(set(image_urls[:5])) if image_urls else [],
+            "hybrid": hybrid,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_cached_search_results(cache_key):
+    """Get a copy of cached search results, or None on a miss"""
+    results = _result_cache.get(cache_key)
+    if results is None:
+        return None
+    # Copy so callers can annotate results without touching the cached list
+    return [dict(result) for result in results]
+
+
+def cache_search_results(cache_key, results):
+    """Store search results and return a copy that is safe for the caller to modify"""
+    _result_cache.set(cache_key, results)
+    return [dict(result) for result in results]
+
+
+def search_apartments(query, filter_dict=None, top_k=10, image_urls=None, hybrid=False):
+    """
+    Search for apartments in the vector index (Pinecone or local, see app.vector_store)
 
     Args:
         query (str): The search query
         filter_dict (dict, optional): Filter criteria for metadata. Defaults to None.
         top_k (int, optional): Number of results to return. Defaults to 10.
         image_urls (list, optional): List of image URLs to analyze. Defaults to None.
+        hybrid (bool, optional): Fuse BM25 keyword matches into the ranking. Defaults to False.
 
     Returns:
         list: List of matching apartments with scores
     """
-    index = pc.Index(INDEX_NAME)
-    search_text = query.strip()
-    if image_urls and len(image_urls) > 0:
-        try:
-            print(f"Processing {len(image_urls)} image URLs for analysis")
-            openai_api_key = os.getenv("OPENAI_API_KEY")
-            if not openai_api_key:
-                print("ERROR: OPENAI_API_KEY not found in environment")
-                return []
-            
-            try:
-                client = openai.OpenAI(api_key=openai_api_key)
-                print("Successfully initialized OpenAI client")
-                messages = [
-                    {"role": "system", "content": "You are a helpful assistant that generates semantic search descriptions for apartment listings. Provide a concise description (less than 20 words) focusing on aesthetics and design elements visible in the images."}
-                ]
-                content = []
-                if search_text:
-                    content.append(
-                        {"type": "text", 
-                         "text": f"These are images of apartment interiors/exteriors. Generate a 20-word search description that combines analyzing these images with the text query: '{search_text}'. Focus on aesthetics and design elements."}
-                    )
-                else:
-                    content.append(
-                        {"type": "text", 
-                         "text": "These are images of apartment interiors/exteriors. Generate a 20-word search description focusing on aesthetics and design elements visible in the images."}
-                    )
-                for url in image_urls[:5]:
-                    print(f"Adding image URL to content: {url[:60]}...")
-                    content.append(
-                        {"type": "image_url", "image_url": {"url": url}}
-                    )
-                messages.append({"role": "user", "content": content})
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=messages,
-                    max_tokens=100
-                )
-                combined_query = response.choices[0].message.content.strip()
-                print(f"Combined query for embedding: {combined_query}")
-                query_embedding = create_embedding(combined_query)
-                
-            except Exception as api_error:
-                print(f"ERROR during OpenAI API call: {api_error}")
-                if search_text:
-                    print(f"Falling back to text-only query: {search_text}")
-                    query_embedding = create_embedding(search_text)
-                else:
-                    print("No fallback query available")
-                    return []
-        except Exception as e:
-            print(f"Error analyzing images with OpenAI: {e}")
-            if search_text:
-                query_embedding = create_embedding(search_text)
-            else:
-                print("No fallback query available")
-                return []
-    else:
-        query_embedding = create_embedding(search_text)
+    cache_key = search_result_cache_key(query, filter_dict, top_k, image_urls, hybrid)
+    cached = get_cached_search_results(cache_key)
+    if cached is not None:
+        return cached
 
+    query_embedding = get_search_embedding(query, image_urls)
     if query_embedding is None:
-        print("Failed to create embedding for query")
+        logger.warning("Failed to create embedding for query")
         return []
-    search_results = index.query(
-        vector=query_embedding, filter=filter_dict, top_k=top_k, include_metadata=True
-    )
+    if hybrid:
+        results = hybrid_query(query, query_embedding, filter_dict, top_k)
+    else:
+        results = query_index(query_embedding, filter_dict, top_k)
+    return cache_search_results(cache_key, results)
+
+
+def query_index(query_embedding, filter_dict=None, top_k=10):
+    """
+    Run a query embedding against the apartment vector index
+
+    Args:
+        query_embedding (list): The query embedding
+        filter_dict (dict, optional): Filter criteria for metadata. Defaults to None.
+        top_k (int, optional): Number of results to return. Defaults to 10.
+
+    Returns:
+        list: List of matching apartments with scores
+    """
+    if filter_dict and VECTOR_STORE_BACKEND != "pinecone":
+        # Pinecone filters metadata natively; other backends get the filter
+        # evaluated on the catalog columns and score only the matching ids
+        apartment_ids = filter_index.candidate_ids(filter_dict)
+        if apartment_ids is not None:
+            filter_dict = {"apartment_id": {"$in": apartment_ids}}
+    if _excludes_all(filter_dict):
+        return []
+    index = get_vector_store(INDEX_NAME)
+    try:
+        with stage("vector_query"):
+            matches = index.query(vector=query_embedding, filter=filter_dict, top_k=top_k)
+    except Exception:
+        metrics.increment("upstream_errors_total", upstream="vector_store")
+        raise
     formatted_results = []
-    for match in search_results.matches:
+    for match in matches:
         result = {"id": match.id, "score": match.score, "metadata": match.metadata}
         formatted_results.append(result)
 
     return formatted_results
 
 
+# Hybrid retrieval: BM25 keyword matches over the catalog (and image captions,
+# if IMAGE_DESCRIPTIONS_FILE points at the captioning script's output) fused
+# with the vector results by reciprocal rank fusion. Exact terms like
+# "rooftop" or a street name are often missed by the embedding alone.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "false").lower() in ("1", "true", "yes")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "100"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+lexical_index = LexicalIndex(
+    catalog,
+    os.getenv(
+        "LEXICAL_INDEX_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), "lexical_index"),
+    ),
+    captions_file=os.getenv("IMAGE_DESCRIPTIONS_FILE"),
+)
+
+
+def lexical_query(query, filter_dict=None, top_k=10):
+    """
+    Run a text query against the BM25 index of the catalog
+
+    Args:
+        query (str): The search query
+        filter_dict (dict, optional): Filter criteria for metadata. Defaults to None.
+        top_k (int, optional): Number of results to return. Defaults to 10.
+
+    Returns:
+        list: List of matching apartments with BM25 scores
+    """
+    if _excludes_all(filter_dict):
+        return []
+    with stage("lexical_query"):
+        matches = lexical_index.search(query, top_k=top_k, filter_dict=filter_dict)
+    return [{"id": match.id, "score": match.score, "metadata": match.metadata} for match in matches]
+
+
+def hybrid_query(query, query_embedding, filter_dict=None, top_k=10):
+    """
+    Rank apartments by reciprocal rank fusion of vector and BM25 results
+
+    Args:
+        query (str): The search query, used for the keyword side
+        query_embedding (list): The query embedding, used for the vector side
+        filter_dict (dict, optional): Filter criteria for metadata. Defaults to None.
+        top_k (int, optional): Number of results to return. Defaults to 10.
+
+    Returns:
+        list: List of matching apartments with fused scores
+    """
+    depth = max(HYBRID_CANDIDATES, top_k)
+    vector_results = query_index(query_embedding, filter_dict, depth)
+    if not query.strip():
+        return vector_results[:top_k]
+    lexical_results = lexical_query(query, filter_dict, depth)
+    return reciprocal_rank_fusion([vector_results, lexical_results], k=HYBRID_RRF_K)[:top_k]
+
+
+# Location filtering. lat/lng/radius_km and bounding-box searches are resolved
+# against a grid index of the catalog's coordinates, and the matching ids are
+# passed to retrieval as an apartment_id pre-filter so only those apartments
+# are scored. Pinecone accepts at most 10000 values in an $in filter.
+GEO_MAX_CANDIDATES = int(os.getenv("GEO_MAX_CANDIDATES", "10000"))
+spatial_index = SpatialIndex(
+    catalog,
+    os.getenv(
+        "SPATIAL_INDEX_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), "spatial_index"),
+    ),
+)
+
+
+class TooManyCandidatesError(ValueError):
+    """Raised when a location filter matches more apartments than can be pre-filtered"""
+
+
+def geo_candidate_ids(lat=None, lng=None, radius_km=None, bbox=None):
+    """
+    Find the apartments matching a location filter
+
+    Args:
+        lat (float, optional): Latitude of the radius search center. Defaults to None.
+        lng (float, optional): Longitude of the radius search center. Defaults to None.
+        radius_km (float, optional): Radius in kilometers. Defaults to None.
+        bbox (tuple, optional): (min_lat, min_lng, max_lat, max_lng). Defaults to None.
+
+    Returns:
+        list: Matching apartment IDs, sorted
+
+    Raises:
+        TooManyCandidatesError: If more than GEO_MAX_CANDIDATES apartments match
+    """
+    if radius_km is not None:
+        apartment_ids = spatial_index.within_radius(lat, lng, radius_km, bbox)
+    else:
+        apartment_ids = spatial_index.within_bbox(*bbox)
+    if len(apartment_ids) > GEO_MAX_CANDIDATES:
+        raise TooManyCandidatesError(
+            f"Location filter matches {len(apartment_ids)} apartments; "
+            f"narrow it to at most {GEO_MAX_CANDIDATES}"
+        )
+    return sorted(apartment_ids)
+
+
+def restrict_to_ids(filter_dict, apartment_ids):
+    """
+    Add an apartment_id pre-filter to a metadata filter
+
+    Args:
+        filter_dict (dict): Filter criteria for metadata, or None
+        apartment_ids (list): The only apartment IDs that may match
+
+    Returns:
+        dict: The combined filter
+    """
+    restriction = {"apartment_id": {"$in": list(apartment_ids)}}
+    if not filter_dict:
+        return restriction
+    if "apartment_id" in filter_dict:
+        return {"$and": [filter_dict, restriction]}
+    return {**filter_dict, **restriction}
+
+
+def _excludes_all(filter_dict):
+    # An empty pre-filter can't match anything; skip the retrieval call
+    if not filter_dict:
+        return False
+    if filter_dict.get("apartment_id") == {"$in": []}:
+        return True
+    return any(_excludes_all(sub) for sub in filter_dict.get("$and", ()))
+
+
+# Ranked result lists kept for cursor pagination. The first page of a search
+# queries SEARCH_PAGINATION_DEPTH results and caches them; later pages are
+# sliced from the cache without embedding, vision or retrieval work. Stored in
+# SQLite so a cursor still works when its next request lands on another worker.
+SEARCH_PAGINATION_DEPTH = int(os.getenv("SEARCH_PAGINATION_DEPTH", "500"))
+SEARCH_PAGE_CACHE_PATH = os.getenv(
+    "SEARCH_PAGE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "search_pages.sqlite"),
+)
+_ranking_cache = create_cache(
+    "search_pages",
+    maxsize=int(os.getenv("SEARCH_PAGE_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("SEARCH_PAGE_CACHE_TTL", "600")),
+    shared_path=SEARCH_PAGE_CACHE_PATH,
+)
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor can't be decoded"""
+
+
+class CursorExpiredError(Exception):
+    """Raised when a pagination cursor refers to results no longer cached"""
+
+
+def _ranking_key(query_embedding, filter_dict, query="", hybrid=False):
+    digest = hashlib.sha256(array("f", query_embedding).tobytes())
+    digest.update(json.dumps(filter_dict, sort_keys=True).encode())
+    if hybrid:
+        digest.update(b"hybrid:" + _normalize_embedding_text(query).encode())
+    digest.update(get_index_version(INDEX_NAME).encode())
+    digest.update(resolve_index_name(INDEX_NAME).encode())
+    return digest.hexdigest()
+
+
+def _encode_cursor(key, offset):
+    payload = json.dumps({"k": key, "o": offset}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key, offset = payload["k"], payload["o"]
+    except Exception:
+        raise InvalidCursorError("Invalid cursor") from None
+    # A negative offset would slice from the end of the ranking
+    if not isinstance(key, str) or type(offset) is not int or offset < 0:
+        raise InvalidCursorError("Invalid cursor")
+    return key, offset
+
+
+def _page(key, ranked, offset, page_size):
+    # Copy so callers can annotate results without touching the cached ranking
+    page = [dict(result) for result in ranked[offset:offset + page_size]]
+    next_offset = offset + page_size
+    next_cursor = _encode_cursor(key, next_offset) if next_offset < len(ranked) else None
+    return page, next_cursor
+
+
+def get_results_page(cursor, page_size):
+    """
+    Get a later page of a paginated search
+
+    Args:
+        cursor (str): The next_cursor returned with the previous page
+        page_size (int): Number of results per page
+
+    Returns:
+        tuple: (list of results, cursor for the following page or None)
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+        CursorExpiredError: If the search's cached results have expired
+    """
+    key, offset = _decode_cursor(cursor)
+    ranked = _ranking_cache.get(key)
+    if ranked is None:
+        raise CursorExpiredError("Cursor has expired; run the search again")
+    return _page(key, ranked, offset, page_size)
+
+
+def start_paginated_search(query_embedding, filter_dict, page_size, query="", hybrid=False):
+    """
+    Rank results for a query embedding and filter, cache the ranking and
+    return its first page
+
+    Args:
+        query_embedding (list): The query embedding
+        filter_dict (dict): Filter criteria for metadata, or None
+        page_size (int): Number of results per page
+        query (str, optional): The search query, used for hybrid ranking. Defaults to "".
+        hybrid (bool, optional): Fuse BM25 keyword matches into the ranking. Defaults to False.
+
+    Returns:
+        tuple: (list of results, cursor for the next page or None)
+    """
+    key = _ranking_key(query_embedding, filter_dict, query, hybrid)
+    ranked = _ranking_cache.get(key)
+    if ranked is None:
+        depth = max(SEARCH_PAGINATION_DEPTH, page_size)
+        if hybrid:
+            ranked = hybrid_query(query, query_embedding, filter_dict, depth)
+        else:
+            ranked = query_index(query_embedding, filter_dict, depth)
+        _ranking_cache.set(key, ranked)
+    return _page(key, ranked, 0, page_size)
+
+
+def search_apartments_paginated(query, filter_dict=None, page_size=50, image_urls=None, cursor=None, hybrid=False):
+    """
+    Cursor-paginated version of search_apartments
+
+    Args:
+        query (str): The search query (ignored when cursor is given)
+        filter_dict (dict, optional): Filter criteria for metadata (ignored when cursor is given)
+        page_size (int, optional): Number of results per page. Defaults to 50.
+        image_urls (list, optional): List of image URLs to analyze (ignored when cursor is given)
+        cursor (str, optional): next_cursor from the previous page. Defaults to None.
+        hybrid (bool, optional): Fuse BM25 keyword matches into the ranking (ignored when
+            cursor is given). Defaults to False.
+
+    Returns:
+        tuple: (list of results, cursor for the next page or None)
+    """
+    if cursor:
+        return get_results_page(cursor, page_size)
+    query_embedding = get_search_embedding(query, image_urls)
+    if query_embedding is None:
+        logger.warning("Failed to create embedding for query")
+        return [], None
+    return start_paginated_search(query_embedding, filter_dict, page_size, query, hybrid)
+
+
+def _build_preview(apartment, query=None, query_embedding=None):
+    """
+    Build the preview payload for a catalog apartment record
+
+    Args:
+        apartment (dict): The raw apartment record from the catalog
+        query (str, optional): The search query to rank images by. Default is None.
+        query_embedding (list, optional): Precomputed embedding of the query. Default is None.
+
+    Returns:
+        dict: Preview data for the apartment
+    """
+    photos = apartment.get("photos", [])
+    if query and photos and len(photos) > 0:
+        ranked_photos = rank_apartment_images_by_query(
+            apartment.get("id"), query, photos, query_embedding=query_embedding
+        )
+        if ranked_photos:
+            photos = ranked_photos
+
+    final_photos = photos
+    if photos and len(photos) > 0:
+        if isinstance(photos[0], dict) and "url" in photos[0]:
+            final_photos = [p["url"] for p in photos if isinstance(p, dict) and "url" in p]
+
+    return {
+        "id": apartment.get("id"),
+        "propertyName": apartment.get("propertyName"),
+        "location": {
+            "city": apartment.get("location", {}).get("city"),
+            "state": apartment.get("location", {}).get("state"),
+        },
+        "coordinates": apartment.get(
+            "coordinates",
+            {
+                "latitude": 34.0522,
+                "longitude": -118.2437,
+            },
+        ),
+        "rent": apartment.get("rent"),
+        "beds": apartment.get("beds"),
+        "baths": apartment.get("baths"),
+        "sqft": apartment.get("sqft"),
+        "photos": final_photos if final_photos and len(final_photos) > 0 else None,
+    }
+
+
 def get_apartment_preview_by_id(apartment_id, query=None):
     """
     Get preview data for a specific apartment by ID, with optional query parameter
@@ -136,56 +687,119 @@ def get_apartment_preview_by_id(apartment_id, query=None):
         dict: Preview data for the apartment or None if not found
     """
     try:
-        with open(APARTMENTS_FILE, "r") as f:
-            apartments = json.load(f)
-        for apartment in apartments:
-            if apartment.get("id") == apartment_id:
-                photos = apartment.get("photos", [])
-                if query and photos and len(photos) > 0:
-                    ranked_photos = rank_apartment_images_by_query(apartment_id, query, photos)
-                    if ranked_photos:
-                        photos = ranked_photos
-
-                final_photos = photos
-                if photos and len(photos) > 0:
-                    if isinstance(photos[0], dict) and "url" in photos[0]:
-                        final_photos = [p["url"] for p in photos if isinstance(p, dict) and "url" in p]
-                        
-                preview = {
-                    "id": apartment.get("id"),
-                    "propertyName": apartment.get("propertyName"),
-                    "location": {
-                        "city": apartment.get("location", {}).get("city"),
-                        "state": apartment.get("location", {}).get("state"),
-                    },
-                    "coordinates": apartment.get(
-                        "coordinates",
-                        {
-                            "latitude": 34.0522,
-                            "longitude": -118.2437,
-                        },
-                    ),
-                    "rent": apartment.get("rent"),
-                    "beds": apartment.get("beds"),
-                    "baths": apartment.get("baths"),
-                    "sqft": apartment.get("sqft"),
-                    "photos": final_photos if final_photos and len(final_photos) > 0 else None,
-                }
-                return preview
-        return None
+        apartment = catalog.get(apartment_id)
+        if apartment is None:
+            return None
+        return _build_preview(apartment, query)
     except Exception as e:
-        print(f"Error retrieving apartment preview: {e}")
+        logger.error("Error retrieving apartment preview: %s", e)
         return None
 
 
-def rank_apartment_images_by_query(apartment_id, query, original_photos):
+def get_apartment_previews_by_ids(apartment_ids, query=None):
+    """
+    Get preview data for several apartments in one call. The query is embedded
+    once and image ranking for the apartments runs concurrently.
+
+    Args:
+        apartment_ids (list): The IDs of the apartments, in the order to return them
+        query (str, optional): The search query to rank images by. Default is None.
+
+    Returns:
+        tuple: (list of preview dicts in request order, list of IDs that were not
+        found, list of IDs whose preview could not be built)
+    """
+    apartments = []
+    missing = []
+    for apartment_id in apartment_ids:
+        apartment = catalog.get(apartment_id)
+        if apartment is None:
+            missing.append(apartment_id)
+        else:
+            apartments.append(apartment)
+
+    query_embedding = create_embedding(query) if query else None
+    # Without the query embedding every apartment would retry it; keep catalog order instead
+    ranking_query = query if query_embedding else None
+
+    def build(apartment):
+        try:
+            return _build_preview(apartment, ranking_query, query_embedding)
+        except Exception as e:
+            logger.error("Error building preview for apartment %s: %s", apartment.get("id"), e)
+            return None
+
+    if query_embedding and len(apartments) > 1:
+        previews = list(_preview_executor.map(build, apartments))
+    else:
+        previews = [build(apartment) for apartment in apartments]
+
+    failed = [apartment.get("id") for apartment, preview in zip(apartments, previews) if preview is None]
+    return [p for p in previews if p is not None], missing, failed
+
+
+def attach_previews_to_results(results, query=None):
+    """
+    Join search results against the catalog, adding each match's preview data
+    under a "preview" key so a single search response is renderable
+
+    Args:
+        results (list): Search results as returned by search_apartments
+        query (str, optional): The search query to rank images by. Default is None.
+
+    Returns:
+        list: The same results, each with a "preview" key (None if not in the catalog)
+    """
+    with stage("previews"):
+        previews, _, _ = get_apartment_previews_by_ids([r["id"] for r in results], query)
+    previews_by_id = {preview["id"]: preview for preview in previews}
+    for result in results:
+        result["preview"] = previews_by_id.get(result["id"])
+    return results
+
+
+def iter_results_with_previews(results, query=None):
     """
-    Rank apartment images by relevance to a search query using Pinecone
+    Streaming version of attach_previews_to_results: yields each result with
+    its "preview" key as soon as that preview is built, in result order
+
+    Args:
+        results (list): Search results as returned by search_apartments
+        query (str, optional): The search query to rank images by. Default is None.
+
+    Yields:
+        dict: Each result with a "preview" key (None if not in the catalog)
+    """
+    query_embedding = create_embedding(query) if query else None
+    ranking_query = query if query_embedding else None
+
+    def build(result):
+        result["preview"] = None
+        apartment = catalog.get(result["id"])
+        if apartment is not None:
+            try:
+                result["preview"] = _build_preview(apartment, ranking_query, query_embedding)
+            except Exception as e:
+                logger.error("Error building preview for apartment %s: %s", result["id"], e)
+        return result
+
+    if query_embedding and len(results) > 1:
+        yield from _preview_executor.map(build, results)
+    else:
+        for result in results:
+            yield build(result)
+
+
+def rank_apartment_images_by_query(apartment_id, query, original_photos, query_embedding=None):
+    """
+    Rank apartment images by relevance to a search query, using the local image
+    embedding matrix when available and the image vector index otherwise
 
     Args:
         apartment_id (str): The ID of the apartment
         query (str): The search query to rank images by
         original_photos (list): Original list of photo objects or URLs
+        query_embedding (list, optional): Precomputed embedding of the query. Default is None.
 
     Returns:
         list: Reordered list of URLs (strings), most relevant first
@@ -202,36 +816,45 @@ def rank_apartment_images_by_query(apartment_id, query, original_photos):
         if not photo_urls:
             return original_photos
 
-        # 2. Embed the query (cached)
-        query_emb = _get_query_embedding(query)
+        # 2. Embed the query (cached), unless the caller already did
+        query_emb = query_embedding or create_embedding(query)
         if not query_emb:
             return photo_urls
 
-        # 3. Only request exactly as many neighbors as you have photos
-        results = image_index.query(
-            vector=query_emb,
-            filter={"apartment_id": apartment_id},
-            top_k=len(photo_urls),
-            include_metadata=True
-        )
+        # 3. Rank locally against the precomputed image embedding matrix
+        image_embeddings = get_image_embeddings()
+        if image_embeddings is not None:
+            with stage("image_ranking_local"):
+                ranked = image_embeddings.rank(apartment_id, query_emb, photo_urls)
+            if ranked is not None:
+                return ranked
+            metrics.increment("fallbacks_total", kind="image_vector_index")
 
-        # 4. Build URL→score map in one go
+        # 4. Otherwise query the image index, asking for exactly as many
+        # neighbors as there are photos
+        with stage("image_vector_query"):
+            matches = get_vector_store(IMAGE_INDEX_NAME).query(
+                vector=query_emb,
+                filter={"apartment_id": apartment_id},
+                top_k=len(photo_urls),
+            )
+
+        # 5. Build URL→score map in one go
         url_score_map = {
             m.metadata["original_url"]: m.score
-            for m in (results.matches or [])
+            for m in matches
             if m.metadata.get("original_url")
         }
 
-        # 5. Sort using Python’s built‑in
+        # 6. Sort using Python’s built‑in
         return sorted(
             photo_urls,
             key=lambda u: url_score_map.get(u, -1),
             reverse=True
         )
     except Exception as e:
-        print(f"Error ranking apartment images: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error ranking apartment images: %s", e)
+        metrics.increment("upstream_errors_total", upstream="image_ranking")
         # Return the extracted URLs if available, otherwise original photos
         return [p["url"] if isinstance(p, dict) and "url" in p else p for p in original_photos]
 
@@ -249,30 +872,25 @@ def get_apartment_details_by_id(apartment_id, query=None):
         dict: All data for the apartment or None if not found
     """
     try:
-        with open(APARTMENTS_FILE, "r") as f:
-            apartments = json.load(f)
-
-        # Find the apartment with the matching ID
-        for apartment in apartments:
-            if apartment.get("id") == apartment_id:
-                # Make a deep copy to avoid modifying the original data
-                result = apartment.copy()
+        apartment = catalog.get(apartment_id)
+        if apartment is None:
+            return None
+
+        # Make a deep copy to avoid modifying the original data
+        result = apartment.copy()
                 
-                # If we have a query and photos, rank them by relevance
-                photos = apartment.get("photos", [])
-                if query and photos and len(photos) > 0:
-                    ranked_photos = rank_apartment_images_by_query(apartment_id, query, photos)
-                    if ranked_photos:
-                        # Ensure we're returning a list of string URLs
-                        if ranked_photos and isinstance(ranked_photos[0], dict) and "url" in ranked_photos[0]:
-                            result["photos"] = [p["url"] for p in ranked_photos if isinstance(p, dict) and "url" in p]
-                        else:
-                            result["photos"] = ranked_photos
+        # If we have a query and photos, rank them by relevance
+        photos = apartment.get("photos", [])
+        if query and photos and len(photos) > 0:
+            ranked_photos = rank_apartment_images_by_query(apartment_id, query, photos)
+            if ranked_photos:
+                # Ensure we're returning a list of string URLs
+                if ranked_photos and isinstance(ranked_photos[0], dict) and "url" in ranked_photos[0]:
+                    result["photos"] = [p["url"] for p in ranked_photos if isinstance(p, dict) and "url" in p]
+                else:
+                    result["photos"] = ranked_photos
                 
-                return result
-
-        # If no matching apartment is found
-        return None
+        return result
     except Exception as e:
-        print(f"Error retrieving apartment details: {e}")
+        logger.error("Error retrieving apartment details: %s", e)
         return None
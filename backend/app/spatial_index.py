@@ -0,0 +1,198 @@
+import os
+import logging
+import json
+import math
+import threading
+import time
+
+import numpy as np
+
+from app.atomic_files import build_lock, write_atomically
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+# Apartments are bucketed into a lat/lng grid of this many degrees per cell
+SPATIAL_CELL_DEGREES = float(os.getenv("SPATIAL_CELL_DEGREES", "0.02"))
+
+# On-disk layout of the index directory:
+#   cells.npy       int64 grid cell key per apartment, sorted ascending
+#   latitudes.npy   float64, aligned with cells.npy
+#   longitudes.npy  float64, aligned with cells.npy
+#   meta.json       apartment ids aligned with cells.npy, catalog signature, cell size
+# Cell keys are row-major (row * columns + column), so the cells of one grid
+# row inside a bounding box form a single contiguous run of the sorted keys.
+META_FILE = "meta.json"
+ARRAY_FILES = ("cells.npy", "latitudes.npy", "longitudes.npy")
+
+
+def _coordinates(apartment):
+    coordinates = apartment.get("coordinates") or {}
+    try:
+        lat = float(coordinates["latitude"])
+        lng = float(coordinates["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distance in km from one point to arrays of points"""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """
+    Grid index over the coordinates of every apartment in the catalog.
+
+    A bounding-box lookup binary-searches one run of sorted cell keys per grid
+    row and checks the exact coordinates of only the apartments in those
+    cells; radius lookups do the same for the circle's bounding box and then
+    apply the haversine distance. The index is saved to disk and rebuilt
+    whenever the catalog changes.
+    """
+
+    def __init__(self, catalog, directory, cell_degrees=SPATIAL_CELL_DEGREES):
+        self.catalog = catalog
+        self.directory = directory
+        self.cell_degrees = cell_degrees
+        self.columns = int(math.ceil(360 / cell_degrees)) + 1
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _cell_row(self, lat):
+        return np.floor((np.asarray(lat) + 90) / self.cell_degrees).astype(np.int64)
+
+    def _cell_column(self, lng):
+        return np.floor((np.asarray(lng) + 180) / self.cell_degrees).astype(np.int64)
+
+    def _load(self, source):
+        meta_path = os.path.join(self.directory, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta.get("source") != source or meta.get("cell_degrees") != self.cell_degrees:
+            return None
+        cells, lats, lngs = (
+            np.load(os.path.join(self.directory, name), mmap_mode="r") for name in ARRAY_FILES
+        )
+        return {"source": source, "ids": meta["ids"], "cells": cells, "lats": lats, "lngs": lngs}
+
+    def _build(self, source):
+        start = time.perf_counter()
+        ids = []
+        points = []
+        for apartment in self.catalog.all():
+            point = _coordinates(apartment)
+            if apartment.get("id") is None or point is None:
+                continue
+            ids.append(apartment["id"])
+            points.append(point)
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        cells = self._cell_row(points[:, 0]) * self.columns + self._cell_column(points[:, 1])
+        order = np.argsort(cells, kind="stable")
+        cells, lats, lngs = cells[order], points[order, 0], points[order, 1]
+        ids = [ids[i] for i in order]
+
+        os.makedirs(self.directory, exist_ok=True)
+        for name, array in zip(ARRAY_FILES, (cells, lats, lngs)):
+            write_atomically(os.path.join(self.directory, name), lambda f: np.save(f, array))
+        write_atomically(
+            os.path.join(self.directory, META_FILE),
+            lambda f: json.dump({"source": source, "cell_degrees": self.cell_degrees, "ids": ids}, f),
+            mode="w",
+        )
+
+        logger.info("Built spatial index for %d apartments in %.2fs", len(ids), time.perf_counter() - start)
+        return {"source": source, "ids": ids, "cells": cells, "lats": lats, "lngs": lngs}
+
+    def _current(self):
+        source = list(self.catalog.version)
+        state = self._state
+        if state is not None and state["source"] == source:
+            return state
+        with self._lock:
+            if self._state is None or self._state["source"] != source:
+                self._state = self._load(source) or self._load_or_build(source)
+            return self._state
+
+    def _load_or_build(self, source):
+        # Only one worker builds; the others wait on the lock and load its files
+        with build_lock(self.directory):
+            return self._load(source) or self._build(source)
+
+    def _rows_in_bbox(self, state, min_lat, min_lng, max_lat, max_lng):
+        cells = state["cells"]
+        first_column, last_column = self._cell_column([min_lng, max_lng])
+        runs = []
+        for row in range(self._cell_row(min_lat), self._cell_row(max_lat) + 1):
+            start = np.searchsorted(cells, row * self.columns + first_column, side="left")
+            stop = np.searchsorted(cells, row * self.columns + last_column, side="right")
+            if stop > start:
+                runs.append(np.arange(start, stop))
+        if not runs:
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate(runs)
+        lats, lngs = state["lats"][rows], state["lngs"][rows]
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+        return rows[inside]
+
+    def within_bbox(self, min_lat, min_lng, max_lat, max_lng):
+        """
+        Find apartments inside a bounding box
+
+        Args:
+            min_lat (float): Southern edge
+            min_lng (float): Western edge
+            max_lat (float): Northern edge
+            max_lng (float): Eastern edge
+
+        Returns:
+            list: IDs of the apartments inside the box
+        """
+        state = self._current()
+        rows = self._rows_in_bbox(state, min_lat, min_lng, max_lat, max_lng)
+        return [state["ids"][row] for row in rows]
+
+    def within_radius(self, lat, lng, radius_km, bbox=None):
+        """
+        Find apartments within a distance of a point
+
+        Args:
+            lat (float): Latitude of the center
+            lng (float): Longitude of the center
+            radius_km (float): Radius in kilometers
+            bbox (tuple, optional): (min_lat, min_lng, max_lat, max_lng) to
+                intersect the circle with. Defaults to None.
+
+        Returns:
+            list: IDs of the apartments within the radius, nearest first
+        """
+        state = self._current()
+        lat_delta = radius_km / KM_PER_DEGREE_LAT
+        cos_lat = math.cos(math.radians(lat))
+        lng_delta = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (KM_PER_DEGREE_LAT * cos_lat))
+        box = [
+            max(-90.0, lat - lat_delta),
+            max(-180.0, lng - lng_delta),
+            min(90.0, lat + lat_delta),
+            min(180.0, lng + lng_delta),
+        ]
+        if bbox is not None:
+            box = [max(box[0], bbox[0]), max(box[1], bbox[1]), min(box[2], bbox[2]), min(box[3], bbox[3])]
+        rows = self._rows_in_bbox(state, *box)
+        if len(rows) == 0:
+            return []
+        distances = haversine_km(lat, lng, state["lats"][rows], state["lngs"][rows])
+        nearby = distances <= radius_km
+        rows, distances = rows[nearby], distances[nearby]
+        return [state["ids"][row] for row in rows[np.argsort(distances, kind="stable")]]
@@ -0,0 +1,414 @@
+import os
+import logging
+import json
+import shutil
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from app.atomic_files import build_lock, write_atomically
+
+logger = logging.getLogger(__name__)
+
+# Local stores with at least this many vectors are searched through an IVF
+# index instead of brute force
+LOCAL_ANN_THRESHOLD = int(os.getenv("LOCAL_ANN_THRESHOLD", "50000"))
+# Number of IVF clusters scanned per query
+LOCAL_IVF_NPROBE = int(os.getenv("LOCAL_IVF_NPROBE", "8"))
+
+# On-disk layout of a local store directory (one directory per index name):
+#   CURRENT         name of the version directory being served
+#   v<timestamp>/   one export, never modified after CURRENT points at it:
+#     vectors.npy     float32 matrix, one row per vector, memory-mapped on load
+#     ids.json        list of vector ids, aligned with the rows of vectors.npy
+#     metadata.json   list of metadata dicts, aligned with the rows of vectors.npy
+#     ivf_*.npy       IVF clustering, built on first load for large stores
+# A directory without CURRENT holds the version files directly
+CURRENT_FILE = "CURRENT"
+VECTORS_FILE = "vectors.npy"
+IDS_FILE = "ids.json"
+METADATA_FILE = "metadata.json"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ORDER_FILE = "ivf_order.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+
+
+class VectorMatch:
+    """A single query result, shaped like a Pinecone match"""
+
+    __slots__ = ("id", "score", "metadata")
+
+    def __init__(self, id, score, metadata):
+        self.id = id
+        self.score = score
+        self.metadata = metadata
+
+
+class VectorStore(ABC):
+    """
+    Interface for the vector retrieval backends.
+
+    Filters use Pinecone's metadata filter syntax: {"field": value} or
+    {"field": {"$gte": ..., "$lte": ...}}, combined with AND across fields.
+    """
+
+    @abstractmethod
+    def query(self, vector, top_k=10, filter=None):
+        """
+        Find the vectors most similar to the query vector
+
+        Args:
+            vector (list): The query embedding
+            top_k (int, optional): Number of matches to return. Defaults to 10.
+            filter (dict, optional): Metadata filter. Defaults to None.
+
+        Returns:
+            list: VectorMatch-like objects with id, score and metadata, best first
+        """
+
+
+class PineconeVectorStore(VectorStore):
+    """VectorStore backed by a Pinecone index, or the index its alias points at"""
+
+    def __init__(self, index_name):
+        self.index_name = index_name
+
+    def query(self, vector, top_k=10, filter=None):
+        from app.index_version import resolve_index_name
+        from app.resources import get_index
+
+        # Resolved per query so a blue/green alias flip takes effect without a restart
+        results = get_index(resolve_index_name(self.index_name)).query(
+            vector=vector, filter=filter, top_k=top_k, include_metadata=True
+        )
+        return results.matches or []
+
+
+def _condition_matches(value, condition):
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, operand in condition.items():
+        if op == "$eq":
+            ok = value == operand
+        elif op == "$ne":
+            ok = value != operand
+        elif op in ("$in", "$nin"):
+            try:
+                ok = value in operand
+            except TypeError:
+                # An unhashable value (e.g. a list) against a compiled set
+                ok = False
+            if op == "$nin":
+                ok = not ok
+        elif value is None:
+            ok = False
+        elif op == "$gte":
+            ok = value >= operand
+        elif op == "$gt":
+            ok = value > operand
+        elif op == "$lte":
+            ok = value <= operand
+        elif op == "$lt":
+            ok = value < operand
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def compile_filter(filter_dict):
+    """
+    Copy a filter with its $in/$nin operands turned into frozensets, so that
+    evaluating it against many rows doesn't rescan long id lists per row.
+    Compile once per query; the result is only for matches_filter, not Pinecone.
+
+    Args:
+        filter_dict (dict): The filter
+
+    Returns:
+        dict: An equivalent filter for matches_filter
+    """
+    compiled = {}
+    for field, condition in filter_dict.items():
+        if field in ("$and", "$or"):
+            compiled[field] = [compile_filter(sub) for sub in condition]
+        elif isinstance(condition, dict):
+            compiled[field] = {
+                op: _as_set(operand) if op in ("$in", "$nin") else operand
+                for op, operand in condition.items()
+            }
+        else:
+            compiled[field] = condition
+    return compiled
+
+
+def _as_set(operand):
+    try:
+        return frozenset(operand)
+    except TypeError:
+        return operand
+
+
+def matches_filter(metadata, filter_dict):
+    """
+    Evaluate a Pinecone-style metadata filter against one metadata dict
+
+    Args:
+        metadata (dict): The vector's metadata
+        filter_dict (dict): The filter
+
+    Returns:
+        bool: True if every field condition holds
+    """
+    for field, condition in filter_dict.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif field == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif not _condition_matches(metadata.get(field), condition):
+            return False
+    return True
+
+
+def _current_version_directory(directory):
+    """The version directory CURRENT points at, or directory itself without one"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), "r") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return directory
+    return os.path.join(directory, version)
+
+
+def write_local_vector_store(directory, ids, vectors, metadata):
+    """
+    Write a store into a new version directory and switch CURRENT to it.
+
+    Readers that already resolved CURRENT keep the previous version, which is
+    left in place; older versions are removed.
+
+    Args:
+        directory (str): Store directory, one per index name
+        ids (list): Vector ids
+        vectors (array-like): One embedding per id
+        metadata (list): One metadata dict per id
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not (len(ids) == len(metadata) == len(vectors)):
+        raise ValueError("ids, vectors and metadata must have the same length")
+
+    with build_lock(directory):
+        previous = _current_version_directory(directory)
+        version = f"v{time.time_ns()}"
+        version_directory = os.path.join(directory, version)
+        os.makedirs(version_directory)
+        np.save(os.path.join(version_directory, VECTORS_FILE), vectors)
+        with open(os.path.join(version_directory, IDS_FILE), "w") as f:
+            json.dump(ids, f)
+        with open(os.path.join(version_directory, METADATA_FILE), "w") as f:
+            json.dump(metadata, f)
+        write_atomically(os.path.join(directory, CURRENT_FILE), lambda f: f.write(version), mode="w")
+
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if (
+                name.startswith("v")
+                and os.path.isdir(path)
+                and path not in (version_directory, previous)
+            ):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process VectorStore over memory-mapped files.
+
+    Small stores are scored exactly with one matrix-vector product. Stores
+    with LOCAL_ANN_THRESHOLD or more vectors use an IVF index: vectors are
+    clustered once (and the clustering saved next to the vectors), and a
+    query scores only the LOCAL_IVF_NPROBE clusters closest to it.
+    """
+
+    def __init__(self, directory):
+        # Resolve the pointer once so every file comes from the same export
+        self.directory = _current_version_directory(directory)
+        self.vectors = np.load(os.path.join(self.directory, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(self.directory, IDS_FILE), "r") as f:
+            self.ids = json.load(f)
+        with open(os.path.join(self.directory, METADATA_FILE), "r") as f:
+            self.metadata = json.load(f)
+        if not (len(self.ids) == len(self.metadata) == self.vectors.shape[0]):
+            raise ValueError(f"Local vector store at {self.directory} has mismatched files")
+
+        norms = np.linalg.norm(self.vectors, axis=1)
+        norms[norms == 0] = 1.0
+        self._inverse_norms = (1.0 / norms).astype(np.float32)
+
+        # apartment_id -> rows, built on the first id pre-filtered query
+        self._rows_by_apartment = None
+
+        self._ivf = None
+        if len(self.ids) >= LOCAL_ANN_THRESHOLD:
+            self._ivf = self._load_or_build_ivf()
+
+    def _load_or_build_ivf(self):
+        paths = [
+            os.path.join(self.directory, name)
+            for name in (IVF_CENTROIDS_FILE, IVF_ORDER_FILE, IVF_OFFSETS_FILE)
+        ]
+        if all(os.path.exists(path) for path in paths):
+            return tuple(np.load(path, mmap_mode="r") for path in paths)
+
+        # Workers opening the store together queue here; the first builds the
+        # clustering and the rest load it
+        with build_lock(self.directory):
+            if all(os.path.exists(path) for path in paths):
+                return tuple(np.load(path, mmap_mode="r") for path in paths)
+
+            start = time.perf_counter()
+            centroids, order, offsets = self._build_ivf()
+            for path, array in zip(paths, (centroids, order, offsets)):
+                write_atomically(path, lambda f: np.save(f, array))
+        logger.info(
+            "Built IVF index with %d clusters for %d vectors in %.1fs",
+            len(centroids),
+            len(self.ids),
+            time.perf_counter() - start,
+        )
+        return centroids, order, offsets
+
+    def _normalized_rows(self, start, stop):
+        return self.vectors[start:stop] * self._inverse_norms[start:stop, None]
+
+    def _assign(self, centroids, chunk_size=8192):
+        assignments = np.empty(len(self.ids), dtype=np.int32)
+        for start in range(0, len(self.ids), chunk_size):
+            stop = start + chunk_size
+            assignments[start:stop] = np.argmax(self._normalized_rows(start, stop) @ centroids.T, axis=1)
+        return assignments
+
+    def _build_ivf(self, iterations=10):
+        # Spherical k-means: cluster on cosine similarity, renormalizing centroids
+        count = len(self.ids)
+        nlist = max(1, int(np.sqrt(count)))
+        rng = np.random.default_rng(0)
+        centroids = self._normalized_rows(0, count)[rng.choice(count, nlist, replace=False)]
+        for _ in range(iterations):
+            assignments = self._assign(centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, self._normalized_rows(0, count))
+            norms = np.linalg.norm(sums, axis=1)
+            empty = norms == 0
+            sums[empty] = centroids[empty]
+            norms[empty] = 1.0
+            centroids = (sums / norms[:, None]).astype(np.float32)
+
+        assignments = self._assign(centroids)
+        order = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assignments[order], np.arange(nlist + 1)).astype(np.int64)
+        return centroids, order, offsets
+
+    def _candidate_rows(self, query):
+        if self._ivf is None:
+            return None
+        centroids, order, offsets = self._ivf
+        nprobe = min(LOCAL_IVF_NPROBE, len(centroids))
+        probe = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probe])
+
+    def _filter_rows(self, rows, filter_dict):
+        if rows is None:
+            rows = range(len(self.ids))
+        return np.fromiter(
+            (row for row in rows if matches_filter(self.metadata[row], filter_dict)),
+            dtype=np.int64,
+        )
+
+    def _apartment_rows(self, filter_dict):
+        """Rows allowed by a top-level apartment_id $in pre-filter, or None without one"""
+        condition = filter_dict.get("apartment_id")
+        if not isinstance(condition, dict) or set(condition) != {"$in"}:
+            return None
+        if self._rows_by_apartment is None:
+            rows_by_apartment = {}
+            for row, metadata in enumerate(self.metadata):
+                rows_by_apartment.setdefault(metadata.get("apartment_id"), []).append(row)
+            self._rows_by_apartment = rows_by_apartment
+        rows = [
+            row
+            for apartment_id in condition["$in"]
+            for row in self._rows_by_apartment.get(apartment_id, ())
+        ]
+        return np.asarray(rows, dtype=np.int64)
+
+    def _score(self, query, rows, top_k):
+        if rows is None:
+            scores = (self.vectors @ query) * self._inverse_norms
+            rows = np.arange(len(scores))
+        else:
+            if len(rows) == 0:
+                return []
+            rows = np.sort(rows)
+            scores = (self.vectors[rows] @ query) * self._inverse_norms[rows]
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return []
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [
+            VectorMatch(self.ids[rows[i]], float(scores[i]), self.metadata[rows[i]])
+            for i in best
+        ]
+
+    def query(self, vector, top_k=10, filter=None):
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        if filter:
+            filter = compile_filter(filter)
+        id_rows = self._apartment_rows(filter) if filter else None
+        if id_rows is not None:
+            # Pre-filtered candidates are few; score all of them exactly
+            # instead of probing IVF clusters
+            remaining = {field: cond for field, cond in filter.items() if field != "apartment_id"}
+            rows = self._filter_rows(id_rows, remaining) if remaining else id_rows
+            return self._score(query, rows, top_k)
+
+        rows = self._candidate_rows(query)
+        if filter:
+            filtered = self._filter_rows(rows, filter)
+            if rows is not None and len(filtered) < top_k:
+                # The probed clusters didn't hold enough matching vectors; a
+                # selective filter leaves few rows, so score them all exactly
+                filtered = self._filter_rows(None, filter)
+            rows = filtered
+        return self._score(query, rows, top_k)
+
+
+def create_vector_store(index_name):
+    """
+    Build the vector store for an index using the configured backend
+
+    Args:
+        index_name (str): Logical index name, e.g. "apartments-search"
+
+    Returns:
+        VectorStore: A Pinecone-backed store, or a local one when
+        VECTOR_STORE_BACKEND=local (read from LOCAL_VECTOR_STORE_DIR/<index_name>)
+    """
+    backend = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+    if backend == "pinecone":
+        return PineconeVectorStore(index_name)
+    if backend == "local":
+        root = os.getenv(
+            "LOCAL_VECTOR_STORE_DIR",
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), "vector_store"),
+        )
+        return LocalVectorStore(os.path.join(root, index_name))
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend}")
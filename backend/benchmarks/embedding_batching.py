@@ -0,0 +1,100 @@
+"""
+Compare query-embedding throughput and latency with and without micro-batching.
+
+Runs the same concurrent workload twice against the real MiniLM model: once
+calling model.encode per request, once through EmbeddingBatcher.
+
+Usage (from the backend directory):
+    python -m benchmarks.embedding_batching --concurrency 16 --requests 2000
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.embedding_batcher import EmbeddingBatcher  # noqa: E402
+from app.resources import get_embedding_model  # noqa: E402
+
+WORDS = [
+    "modern", "loft", "pool", "gym", "quiet", "sunny", "downtown", "balcony",
+    "hardwood", "floors", "pet", "friendly", "parking", "rooftop", "view",
+    "studio", "spacious", "kitchen", "washer", "dryer", "beach", "walkable",
+]
+
+
+def make_queries(count):
+    # Distinct queries so neither run benefits from any caching
+    queries = []
+    for i in range(count):
+        words = [WORDS[(i * 7 + j * 3) % len(WORDS)] for j in range(3 + i % 5)]
+        queries.append(f"{' '.join(words)} {i}")
+    return queries
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(label, encode, queries, concurrency):
+    latencies = []
+    lock = threading.Lock()
+    position = [0]
+
+    def worker():
+        while True:
+            with lock:
+                if position[0] >= len(queries):
+                    return
+                query = queries[position[0]]
+                position[0] += 1
+            start = time.perf_counter()
+            encode(query)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    print(
+        f"{label:<10} {len(queries) / wall:8.1f} req/s   "
+        f"p50 {percentile(latencies, 50) * 1000:7.2f} ms   "
+        f"p99 {percentile(latencies, 99) * 1000:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    model = get_embedding_model()
+    model.encode("warm up")
+    queries = make_queries(args.requests)
+
+    run("unbatched", lambda q: model.encode(q).tolist(), queries, args.concurrency)
+
+    batcher = EmbeddingBatcher(
+        get_embedding_model, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms
+    )
+    run("batched", batcher.encode, queries, args.concurrency)
+    print(f"batcher: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+In-process stand-ins for Pinecone, OpenAI and the embedding model, used by
+the load test so the Flask app can be driven without network access.
+
+Each fake sleeps for a configurable latency (plus uniform jitter) before
+answering, releasing the GIL like a real network call would.
+"""
+import hashlib
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.catalog import derive_filters
+from app.vector_store import VectorMatch, matches_filter
+
+EMBEDDING_DIMENSIONS = 384
+
+
+class Latency:
+    """
+    Injected latency: a mean in milliseconds with +/- jitter as a fraction of it
+
+    Args:
+        mean_ms (float): Mean delay per call
+        jitter (float, optional): Spread of the uniform delay around the mean,
+            e.g. 0.5 for 50%-150% of mean_ms. Defaults to 0.5.
+    """
+
+    def __init__(self, mean_ms, jitter=0.5):
+        self.mean_ms = mean_ms
+        self.jitter = jitter
+
+    def sleep(self):
+        if self.mean_ms <= 0:
+            return
+        spread = self.mean_ms * self.jitter
+        time.sleep(max(0.0, random.uniform(self.mean_ms - spread, self.mean_ms + spread)) / 1000)
+
+
+def fake_embedding(text):
+    """Deterministic unit vector for a text, so equal texts embed equally"""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSIONS).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbeddingModel:
+    """
+    Stand-in for the SentenceTransformer model. encode() takes the same
+    arguments; keyword options such as batch_size are accepted and ignored.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def encode(self, sentences, **kwargs):
+        self.latency.sleep()
+        if isinstance(sentences, str):
+            return fake_embedding(sentences)
+        return np.stack([fake_embedding(t) for t in sentences])
+
+
+class FakeIndex:
+    """
+    Pinecone index over random vectors, answering query() by exact dot product
+
+    Args:
+        ids (list): Vector ids
+        metadata (list): One metadata dict per id, with an apartment_id
+        latency (Latency): Delay added to every query
+    """
+
+    def __init__(self, ids, metadata, latency):
+        self.ids = ids
+        self.metadata = metadata
+        self.latency = latency
+        self.vectors = np.stack([fake_embedding(f"vector:{i}") for i in ids]) if ids else np.zeros(
+            (0, EMBEDDING_DIMENSIONS), dtype=np.float32
+        )
+        self._rows_by_apartment = {}
+        for row, meta in enumerate(metadata):
+            self._rows_by_apartment.setdefault(meta["apartment_id"], []).append(row)
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def _candidate_rows(self, filter):
+        if not filter:
+            return np.arange(len(self.ids))
+        condition = filter.get("apartment_id") if len(filter) == 1 else None
+        if isinstance(condition, str):
+            return np.asarray(self._rows_by_apartment.get(condition, []), dtype=np.int64)
+        if isinstance(condition, dict) and list(condition) == ["$in"]:
+            rows = [row for i in condition["$in"] for row in self._rows_by_apartment.get(i, [])]
+            return np.asarray(rows, dtype=np.int64)
+        return np.asarray(
+            [row for row, meta in enumerate(self.metadata) if matches_filter(meta, filter)],
+            dtype=np.int64,
+        )
+
+    def query(self, vector, filter=None, top_k=10, include_metadata=True):
+        with self._lock:
+            self.queries += 1
+        self.latency.sleep()
+        rows = self._candidate_rows(filter)
+        if len(rows) == 0:
+            return SimpleNamespace(matches=[])
+        scores = self.vectors[rows] @ np.asarray(vector, dtype=np.float32)
+        top = np.argsort(-scores, kind="stable")[:top_k]
+        return SimpleNamespace(
+            matches=[
+                VectorMatch(
+                    self.ids[rows[i]],
+                    float(scores[i]),
+                    self.metadata[rows[i]] if include_metadata else None,
+                )
+                for i in top
+            ]
+        )
+
+    def fetch(self, ids, namespace=None):
+        # Only the index alias record is ever fetched, and the fake has none
+        return SimpleNamespace(vectors={})
+
+
+def _photo_urls(apartment):
+    return [
+        photo["url"] if isinstance(photo, dict) else photo
+        for photo in apartment.get("photos") or []
+        if isinstance(photo, str) or (isinstance(photo, dict) and photo.get("url"))
+    ]
+
+
+class FakePinecone:
+    """
+    Stand-in for the Pinecone client. Index(name) serves the apartments index
+    or the per-photo image index built from the same catalog.
+
+    Args:
+        apartments (list): Raw apartment records
+        latency (Latency): Delay added to every query
+    """
+
+    def __init__(self, apartments, latency):
+        apartments = [a for a in apartments if a.get("id") is not None]
+        ids = [a["id"] for a in apartments]
+        metadata = [{"apartment_id": a["id"], **derive_filters(a)} for a in apartments]
+        image_ids = []
+        image_metadata = []
+        for apartment in apartments:
+            for position, url in enumerate(_photo_urls(apartment)):
+                image_ids.append(f"{apartment['id']}_{position}")
+                image_metadata.append({"apartment_id": apartment["id"], "original_url": url})
+        self.indexes = {
+            "apartments-search": FakeIndex(ids, metadata, latency),
+            "apartment-images-search": FakeIndex(image_ids, image_metadata, latency),
+        }
+
+    def Index(self, name, pool_threads=None):
+        return self.indexes[name]
+
+
+class FakeOpenAI:
+    """Stand-in for the OpenAI client: chat.completions.create returns a short description"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, **kwargs):
+        self.latency.sleep()
+        urls = [
+            part["image_url"]["url"]
+            for part in messages[-1]["content"]
+            if part.get("type") == "image_url"
+        ]
+        content = "bright modern interior with " + " ".join(url.rsplit("/", 1)[-1] for url in urls)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
@@ -0,0 +1,421 @@
+"""
+Replay a mix of search, preview and details requests against the Flask app
+and report throughput and latency percentiles per endpoint.
+
+The app is booted from run.py with Pinecone, OpenAI and (by default) the
+embedding model replaced by the in-process fakes in benchmarks.fakes, each
+with its own injected latency, so runs are repeatable and need no network
+or API keys. Requests go through Flask's WSGI test client from a pool of
+worker threads.
+
+Scenarios (weights set with --mix):
+    text           GET /api/search with a text query
+    filtered       GET /api/search with price/bedroom filters and sometimes a radius
+    image          GET /api/search with imageUrls (vision description + embedding)
+    stream         GET /api/search streamed as NDJSON with inlined previews; a
+                   body that doesn't parse back into results counts as an error
+    preview        GET /api/apartment/preview/<id> with a query
+    preview_storm  --storm-size concurrent preview GETs for one result page,
+                   as the frontend fires after a search
+    previews       POST /api/apartment/previews for one result page
+    details        GET /api/apartment/details/<id> with a query
+
+A request counts as an error when it gets a non-2xx status, a JSON body with
+an "error", or no results where the scenario expects some (e.g. a search that
+answered 200 with nothing because embedding failed).
+
+Usage (from the backend directory):
+    python -m benchmarks.load_test --concurrency 16 --duration 30
+    python -m benchmarks.load_test --mix text=5,image=1,preview_storm=2 --pinecone-latency-ms 40
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = ("text", "filtered", "image", "stream", "preview", "preview_storm", "previews", "details")
+DEFAULT_MIX = "text=4,filtered=3,image=1,stream=1,preview=2,preview_storm=1,previews=1,details=1"
+
+WORDS = [
+    "modern", "loft", "pool", "gym", "quiet", "sunny", "downtown", "balcony",
+    "hardwood", "floors", "pet", "friendly", "parking", "rooftop", "view",
+    "studio", "spacious", "kitchen", "washer", "dryer", "beach", "walkable",
+]
+AMENITIES = ["Pool", "Gym", "Washer/Dryer In Unit", "Rooftop Deck", "Parking", "Pet Friendly", "Balcony"]
+NEIGHBORHOODS = ["Koreatown", "Santa Monica", "Echo Park", "Silver Lake", "Downtown", "Venice", "Culver City"]
+
+
+def make_catalog(size, seed):
+    """Synthetic apartments shaped like the scraped records in apartments.json"""
+    rng = random.Random(seed)
+    apartments = []
+    for i in range(size):
+        beds = rng.randint(0, 4)
+        rent_min = rng.randrange(1200, 6000, 50)
+        apartments.append({
+            "id": f"apt-{i}",
+            "propertyName": f"{rng.choice(WORDS).title()} {rng.choice(NEIGHBORHOODS)} {i}",
+            "location": {"city": "Los Angeles", "state": "CA"},
+            "rent": {"min": rent_min, "max": None if rng.random() < 0.1 else rent_min + rng.randrange(0, 1500, 50)},
+            "beds": "Studio" if beds == 0 else f"{beds} Beds",
+            "baths": f"{rng.randint(1, 3)} Baths",
+            "sqft": str(rng.randrange(400, 2000, 25)),
+            "photos": [
+                {"url": f"https://images.example.com/apt-{i}/{n}.jpg"}
+                for n in range(rng.randint(3, 15))
+            ],
+            "description": " ".join(rng.choice(WORDS) for _ in range(40)),
+            "amenities": rng.sample(AMENITIES, rng.randint(1, 5)),
+            "breadcrumbs": ["CA", "Los Angeles", rng.choice(NEIGHBORHOODS)],
+            "coordinates": {
+                "latitude": round(rng.uniform(33.9, 34.2), 6),
+                "longitude": round(rng.uniform(-118.5, -118.2), 6),
+            },
+        })
+    return apartments
+
+
+def make_queries(count, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))) for _ in range(count)]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}; expected one of {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def configure_environment(args, workdir):
+    """Point every file the app reads or writes at workdir, before importing it"""
+    catalog_path = args.catalog
+    if catalog_path is None:
+        catalog_path = os.path.join(workdir, "apartments.json")
+        with open(catalog_path, "w") as f:
+            json.dump(make_catalog(args.catalog_size, args.seed), f)
+    os.environ.update({
+        "APARTMENTS_FILE": catalog_path,
+        "VECTOR_STORE_BACKEND": "pinecone",
+        "PINECONE_API_KEY": "load-test",
+        "OPENAI_API_KEY": "load-test",
+        "VISION_CACHE_PATH": os.path.join(workdir, "vision.sqlite"),
+        "SEARCH_PAGE_CACHE_PATH": os.path.join(workdir, "search_pages.sqlite"),
+        "LEXICAL_INDEX_DIR": os.path.join(workdir, "lexical_index"),
+        "SPATIAL_INDEX_DIR": os.path.join(workdir, "spatial_index"),
+        "INDEX_VERSION_FILE": os.path.join(workdir, "index_version.json"),
+        # No local image matrix, so image ranking queries the (fake) image index
+        "IMAGE_EMBEDDINGS_DIR": os.path.join(workdir, "image_embeddings"),
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    return catalog_path
+
+
+def install_fakes(args, catalog_path):
+    from app import resources
+    from benchmarks.fakes import FakeEmbeddingModel, FakeOpenAI, FakePinecone, Latency
+
+    with open(catalog_path, "r") as f:
+        apartments = json.load(f)
+    resources.install("pinecone", FakePinecone(apartments, Latency(args.pinecone_latency_ms, args.jitter)))
+    resources.install("openai", FakeOpenAI(Latency(args.openai_latency_ms, args.jitter)))
+    if not args.real_embeddings:
+        resources.install("embedding_model", FakeEmbeddingModel(Latency(args.embed_latency_ms, args.jitter)))
+    return [a["id"] for a in apartments if a.get("id") is not None]
+
+
+# Recorded instead of the real status for a 2xx response whose body reports an
+# error or is missing what the request asked for, e.g. a search that fell back
+# to returning nothing because every embedding failed
+BAD_BODY_STATUS = 599
+
+
+def is_success(status):
+    return 200 <= status < 300
+
+
+def check(response, expect=None):
+    """
+    Status to record for a response: its own status unless it is a 2xx whose
+    JSON body has an "error" or an empty or missing expect field
+
+    Args:
+        response: A Flask test client response
+        expect (str, optional): Top-level field that must be present and non-empty
+
+    Returns:
+        int: The status, or BAD_BODY_STATUS
+    """
+    if not is_success(response.status_code):
+        return response.status_code
+    data = response.get_data()
+    if response.headers.get("Content-Encoding") == "gzip":
+        data = gzip.decompress(data)
+    try:
+        body = json.loads(data)
+    except ValueError:
+        return BAD_BODY_STATUS
+    if not isinstance(body, dict) or "error" in body:
+        return BAD_BODY_STATUS
+    if expect is not None and not body.get(expect):
+        return BAD_BODY_STATUS
+    return response.status_code
+
+
+class Workload:
+    """Builds and sends one request (or storm of requests) per scenario"""
+
+    def __init__(self, client_factory, apartment_ids, queries, args):
+        self.client_factory = client_factory
+        self.apartment_ids = apartment_ids
+        self.queries = queries
+        self.args = args
+        self.storm_executor = ThreadPoolExecutor(
+            max_workers=args.storm_size * args.concurrency, thread_name_prefix="storm"
+        )
+        self._local = threading.local()
+
+    def client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.client_factory()
+        return client
+
+    def get(self, path, params=None, expect=None):
+        url = path + ("?" + urlencode(params) if params else "")
+        return check(self.client().get(url, headers={"Accept-Encoding": "gzip"}), expect)
+
+    def stream(self, params):
+        # A server that fails mid-stream has still sent a 200 status line, so
+        # the body must parse back into results
+        response = self.client().get("/api/search?" + urlencode(params))
+        if not is_success(response.status_code):
+            return response.status_code
+        try:
+            results = [json.loads(line) for line in response.get_data().splitlines()]
+        except ValueError:
+            return BAD_BODY_STATUS
+        if not results or any("id" not in result or "preview" not in result for result in results):
+            return BAD_BODY_STATUS
+        return response.status_code
+
+    def page(self, rng):
+        return rng.sample(self.apartment_ids, min(self.args.page_size, len(self.apartment_ids)))
+
+    def run(self, scenario, rng):
+        """
+        Send one scenario's request(s)
+
+        Returns:
+            list: (endpoint, status, seconds) for each request sent
+        """
+        query = rng.choice(self.queries)
+        start = time.perf_counter()
+        if scenario == "text":
+            endpoint = "GET /api/search (text)"
+            status = self.get("/api/search", {"query": query, "limit": self.args.page_size}, expect="results")
+        elif scenario == "filtered":
+            endpoint = "GET /api/search (filtered)"
+            params = {
+                "query": query,
+                "limit": self.args.page_size,
+                "min_price": rng.randrange(1000, 3000, 250),
+                "max_price": rng.randrange(3500, 8000, 250),
+                "min_bedrooms": rng.randint(0, 2),
+            }
+            if rng.random() < 0.5:
+                params.update(lat=round(rng.uniform(33.95, 34.15), 3), lng=round(rng.uniform(-118.45, -118.25), 3), radius_km=5)
+            status = self.get("/api/search", params, expect="results")
+        elif scenario == "image":
+            endpoint = "GET /api/search (image)"
+            urls = [f"https://uploads.example.com/{rng.randrange(self.args.query_pool)}/{n}.jpg" for n in range(2)]
+            status = self.get(
+                "/api/search",
+                {"query": query, "imageUrls": json.dumps(urls), "limit": self.args.page_size},
+                expect="results",
+            )
+        elif scenario == "stream":
+            endpoint = "GET /api/search (stream)"
+            status = self.stream({"query": query, "limit": self.args.page_size, "stream": "ndjson", "include": "preview"})
+        elif scenario == "preview":
+            endpoint = "GET /api/apartment/preview"
+            status = self.get(
+                f"/api/apartment/preview/{rng.choice(self.apartment_ids)}", {"query": query}, expect="apartment"
+            )
+        elif scenario == "details":
+            endpoint = "GET /api/apartment/details"
+            status = self.get(
+                f"/api/apartment/details/{rng.choice(self.apartment_ids)}", {"query": query}, expect="apartment"
+            )
+        elif scenario == "previews":
+            endpoint = "POST /api/apartment/previews"
+            response = self.client().post(
+                "/api/apartment/previews", json={"ids": self.page(rng)[:self.args.storm_size], "query": query}
+            )
+            status = check(response, "apartments")
+            if status == response.status_code and response.get_json().get("failed"):
+                status = BAD_BODY_STATUS
+        else:
+            return self.storm(rng, query)
+        return [(endpoint, status, time.perf_counter() - start)]
+
+    def storm(self, rng, query):
+        start = time.perf_counter()
+
+        def preview(apartment_id):
+            sent = time.perf_counter()
+            status = self.get(f"/api/apartment/preview/{apartment_id}", {"query": query}, expect="apartment")
+            return "GET /api/apartment/preview", status, time.perf_counter() - sent
+
+        samples = list(self.storm_executor.map(preview, self.page(rng)[:self.args.storm_size]))
+        failures = [sample[1] for sample in samples if not is_success(sample[1])]
+        status = failures[0] if failures else 200
+        samples.append(("preview storm (whole page)", status, time.perf_counter() - start))
+        return samples
+
+
+def replay(workload, mix, args):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = []
+    lock = threading.Lock()
+    sent = [0]
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    def worker(worker_id):
+        rng = random.Random(args.seed * 1000 + worker_id)
+        local = []
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    break
+            else:
+                with lock:
+                    if sent[0] >= args.requests:
+                        break
+                    sent[0] += 1
+            local.extend(workload.run(rng.choices(names, weights)[0], rng))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def report(samples, wall):
+    by_endpoint = {}
+    for endpoint, status, seconds in samples:
+        by_endpoint.setdefault(endpoint, []).append((status, seconds))
+
+    rows = []
+    for endpoint, entries in sorted(by_endpoint.items()):
+        latencies = sorted(seconds for _, seconds in entries)
+        rows.append({
+            "endpoint": endpoint,
+            "requests": len(entries),
+            "errors": sum(1 for status, _ in entries if not is_success(status)),
+            "rps": round(len(entries) / wall, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+        })
+
+    print(f"{'endpoint':<32} {'reqs':>7} {'errs':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for row in rows:
+        print(
+            f"{row['endpoint']:<32} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8.1f} "
+            f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f}"
+        )
+    print(f"total {len(samples)} requests in {wall:.1f}s ({len(samples) / wall:.1f} req/s)")
+    return rows
+
+
+def report_stages(app):
+    # Server-side view of the same run, from the app's own stage histograms
+    summary = app.test_client().get("/api/metrics?format=json").get_json()
+    stages = summary.get("histograms", {}).get("stage_duration_seconds", [])
+    if stages:
+        print()
+        print(f"{'stage':<32} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for entry in stages:
+        print(
+            f"{entry['labels'].get('stage', ''):<32} {entry['count']:>7} "
+            + " ".join(f"{(entry[q] or 0) * 1000:>8.2f}" for q in ("p50", "p95", "p99"))
+        )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight pairs, comma separated")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="scenarios to run (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="run for this many seconds instead")
+    parser.add_argument("--catalog", help="apartments.json to serve (default: a synthetic catalog)")
+    parser.add_argument("--catalog-size", type=int, default=2000)
+    parser.add_argument("--query-pool", type=int, default=500, help="distinct queries; smaller means more cache hits")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--storm-size", type=int, default=20, help="previews fetched per preview storm / batch")
+    parser.add_argument("--pinecone-latency-ms", type=float, default=25)
+    parser.add_argument("--openai-latency-ms", type=float, default=800)
+    parser.add_argument("--embed-latency-ms", type=float, default=8)
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency spread as a fraction of the mean")
+    parser.add_argument("--real-embeddings", action="store_true", help="use the MiniLM model instead of a fake")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory(prefix="vibesearch-load-") as workdir:
+        catalog_path = configure_environment(args, workdir)
+
+        from run import app
+        from app import metrics
+
+        apartment_ids = install_fakes(args, catalog_path)
+        workload = Workload(app.test_client, apartment_ids, make_queries(args.query_pool, args.seed), args)
+
+        # Build the catalog indexes and warm the clients before measuring
+        warmup = random.Random(args.seed)
+        for scenario in mix:
+            workload.run(scenario, warmup)
+        metrics.reset()
+
+        samples, wall = replay(workload, mix, args)
+        rows = report(samples, wall)
+        summary = report_stages(app)
+        workload.storm_executor.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "wall_seconds": wall, "endpoints": rows, "server": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import gc
+import os
+
+# Usage: gunicorn -c gunicorn.conf.py run:app
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# Threaded workers let a slow image search hold one thread instead of a whole
+# worker; pair with SERVING_MODE=async to overlap upstream calls per request
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+
+# Preload mode: import the app and load the embedding model once in the
+# master, then fork workers that share the model's pages copy-on-write
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() in ("1", "true", "yes")
+if preload_app:
+    os.environ.setdefault("PRELOAD_RESOURCES", "1")
+
+
+def when_ready(server):
+    if preload_app:
+        # Move preloaded objects out of the GC's tracked generations so
+        # collections in the workers don't write to (and un-share) their pages
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import logging_config, resources
+
+    logging_config.reset_after_fork()
+    resources.reset_after_fork()
+
+
+def post_worker_init(worker):
+    from app import resources
+
+    resources.report_startup(f"worker {worker.pid}")
@@ -0,0 +1,66 @@
+import os
+import json
+import numpy as np
+from dotenv import load_dotenv
+from export_local_vector_store import fetch_all_vectors
+
+# Load environment variables
+load_dotenv()
+
+IMAGE_INDEX = "apartment-images-search"
+# Where the backend looks for the matrix (IMAGE_EMBEDDINGS_DIR)
+OUTPUT_DIR = os.getenv("IMAGE_EMBEDDINGS_DIR", "../backend/image_embeddings")
+
+
+def build_image_embedding_matrix(ids: list, vectors: list, metadata: list):
+    """
+    Group image embeddings by apartment into one contiguous matrix.
+    Args:
+        ids (list): Vector ids from the image index
+        vectors (list): Image embeddings, aligned with ids
+        metadata (list): Metadata dicts with apartment_id and original_url, aligned with ids
+    Returns:
+        tuple: (float32 matrix of L2-normalized rows, {apartment_id: [start, stop]}, row urls)
+    """
+    rows = [
+        (meta["apartment_id"], meta["original_url"], vector)
+        for meta, vector in zip(metadata, vectors)
+        if meta.get("apartment_id") and meta.get("original_url")
+    ]
+    rows.sort(key=lambda row: row[0])
+
+    matrix = np.asarray([row[2] for row in rows], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+
+    ranges = {}
+    for position, (apartment_id, _, _) in enumerate(rows):
+        if apartment_id in ranges:
+            ranges[apartment_id][1] = position + 1
+        else:
+            ranges[apartment_id] = [position, position + 1]
+    urls = [row[1] for row in rows]
+    return matrix, ranges, urls
+
+
+def main():
+    ids, vectors, metadata = fetch_all_vectors(IMAGE_INDEX)
+    matrix, ranges, urls = build_image_embedding_matrix(ids, vectors, metadata)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    embeddings_path = os.path.join(OUTPUT_DIR, "embeddings.npy")
+    with open(embeddings_path + ".tmp", "wb") as f:
+        np.save(f, matrix)
+    os.replace(embeddings_path + ".tmp", embeddings_path)
+    # index.json goes last: the backend reloads when it changes
+    index_path = os.path.join(OUTPUT_DIR, "index.json")
+    with open(index_path + ".tmp", "w") as f:
+        json.dump({"apartments": ranges, "urls": urls}, f)
+    os.replace(index_path + ".tmp", index_path)
+
+    print(f"Wrote {matrix.shape[0]} image embeddings for {len(ranges)} apartments to {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
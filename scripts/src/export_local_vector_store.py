@@ -0,0 +1,71 @@
+import os
+import sys
+from tqdm import tqdm
+from pinecone import Pinecone
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+if not PINECONE_API_KEY:
+    raise ValueError("PINECONE_API_KEY not found in environment variables")
+
+# Where the backend looks for local stores when VECTOR_STORE_BACKEND=local
+OUTPUT_DIR = os.getenv("LOCAL_VECTOR_STORE_DIR", "../backend/vector_store")
+# The store layout is owned by the backend, so write it with the backend's writer
+BACKEND_DIR = os.getenv("BACKEND_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+DEFAULT_INDEXES = ["apartments-search", "apartment-images-search"]
+FETCH_BATCH_SIZE = 100
+
+sys.path.insert(0, BACKEND_DIR)
+from app.vector_store import write_local_vector_store  # noqa: E402
+
+pc = Pinecone(api_key=PINECONE_API_KEY)
+
+
+def fetch_all_vectors(index_name: str):
+    """
+    Fetch every vector of a serverless Pinecone index.
+    Args:
+        index_name (str): The name of the Pinecone index to read
+    Returns:
+        tuple: (ids, vectors, metadata) as row-aligned lists
+    """
+    index = pc.Index(index_name)
+    total = index.describe_index_stats().total_vector_count
+
+    ids, vectors, metadata = [], [], []
+    with tqdm(total=total, desc=f"Fetching {index_name}") as progress:
+        for id_batch in index.list(limit=FETCH_BATCH_SIZE):
+            fetched = index.fetch(ids=list(id_batch)).vectors
+            for vector_id in id_batch:
+                vector = fetched.get(vector_id)
+                if vector is None:
+                    continue
+                ids.append(vector_id)
+                vectors.append(vector.values)
+                metadata.append(dict(vector.metadata or {}))
+            progress.update(len(id_batch))
+    return ids, vectors, metadata
+
+
+def export_index(index_name: str):
+    """
+    Copy every vector of a serverless Pinecone index into a local store.
+    Args:
+        index_name (str): The name of the Pinecone index to export
+    """
+    ids, vectors, metadata = fetch_all_vectors(index_name)
+    write_local_vector_store(os.path.join(OUTPUT_DIR, index_name), ids, vectors, metadata)
+    print(f"Exported {len(ids)} vectors from {index_name} to {os.path.join(OUTPUT_DIR, index_name)}")
+
+
+def main():
+    index_names = sys.argv[1:] or DEFAULT_INDEXES
+    for index_name in index_names:
+        export_index(index_name)
+
+
+if __name__ == "__main__":
+    main()
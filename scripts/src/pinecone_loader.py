@@ -1,9 +1,17 @@
 import os
 import json
+import time
+import hashlib
+import random
+import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime
+from functools import lru_cache
 from tqdm import tqdm
 from sentence_transformers import SentenceTransformer
 from pinecone import Pinecone, ServerlessSpec
+from urllib3.exceptions import MaxRetryError, ProtocolError, TimeoutError as Urllib3TimeoutError
 from dotenv import load_dotenv
 import re
 
@@ -19,16 +27,64 @@ INPUT_FILE = "data/apartments.json"
 SEMANTIC_DESCRIPTION_FILE = "src/semantic_descriptions.json"
 APARTMENT_IMAGE_DESCRIPTIONS_FILE = "output/apartment_image_descriptions.json"
 
+# Stamp read by a backend on this host; rewriting it invalidates cached search
+# results there. Backends elsewhere read the version from the alias record.
+INDEX_VERSION_FILE = os.getenv("INDEX_VERSION_FILE", "../backend/index_version.json")
+
+# Which versioned index serves INDEX is recorded in Pinecone itself, as one
+# record in a reserved namespace of the base index, so every deployed backend
+# reads the same alias. The base index is therefore never pruned.
+ALIAS_NAMESPACE = os.getenv("INDEX_ALIAS_NAMESPACE", "index-alias")
+ALIAS_RECORD_ID = "live"
+
+# Content hash of every indexed apartment, used by --incremental to find
+# what changed since the last run
+INDEX_MANIFEST_FILE = os.getenv("INDEX_MANIFEST_FILE", "output/index_manifest.json")
+# Seconds a new index gets to report all its vectors before the build is
+# rejected, and documents queried to check it returns them. A sample whose top
+# match is another apartment still passes at this score, since apartments with
+# identical descriptions embed identically.
+VERIFY_TIMEOUT = float(os.getenv("VERIFY_TIMEOUT", "300"))
+VERIFY_SAMPLES = int(os.getenv("VERIFY_SAMPLES", "5"))
+VERIFY_MIN_SCORE = float(os.getenv("VERIFY_MIN_SCORE", "0.999"))
+# Upserts: batches in flight at once, and the most vectors / JSON bytes per
+# batch (Pinecone rejects requests over 2MB or 1000 vectors). Throttled or
+# failed batches are retried with exponential backoff from UPSERT_BACKOFF_SECONDS.
+UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+UPSERT_MAX_BATCH_VECTORS = int(os.getenv("UPSERT_MAX_BATCH_VECTORS", "100"))
+UPSERT_MAX_BATCH_BYTES = int(os.getenv("UPSERT_MAX_BATCH_BYTES", str(1_500_000)))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "6"))
+UPSERT_BACKOFF_SECONDS = float(os.getenv("UPSERT_BACKOFF_SECONDS", "1.0"))
+# Most ids Pinecone accepts in one delete call
+DELETE_BATCH_SIZE = 1000
+
 # Check if required API key is set
 if not PINECONE_API_KEY:
     raise ValueError("PINECONE_API_KEY not found in environment variables")
 
-# Initialize sentence-transformer model
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Descriptions encoded per model call, and processes encoding in parallel
+# (1 encodes in this process)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+
+# Sentence-transformer model, loaded on first use (once per embedding worker)
+_model = None
 
 # Initialize Pinecone client
 pc = Pinecone(api_key=PINECONE_API_KEY)
 
+def get_model() -> SentenceTransformer:
+    """
+    Get this process's sentence-transformer model, loading it on first use.
+    Returns:
+        SentenceTransformer: The all-MiniLM-L6-v2 model
+    """
+    global _model
+    if _model is None:
+        _model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    return _model
+
 class PineconeEntry:
     def __init__(self, id: str, embedding: any, metadata: any):
         self.id = id
@@ -36,6 +92,43 @@ class PineconeEntry:
         self.metadata = metadata
 
 
+@lru_cache(maxsize=None)
+def load_apartments_by_id(path: str = INPUT_FILE) -> dict:
+    """
+    Parse the apartments file once and index it by apartment ID.
+    Args:
+        path (str): The apartments JSON file
+    Returns:
+        dict: Apartment ID -> apartment record, in file order
+    """
+    with open(path, "r") as f:
+        apartments = json.load(f)
+    return {apartment["id"]: apartment for apartment in apartments if apartment.get("id") is not None}
+
+@lru_cache(maxsize=None)
+def load_semantic_descriptions_by_id(path: str = APARTMENT_IMAGE_DESCRIPTIONS_FILE) -> dict:
+    """
+    Parse the image descriptions file once and combine each apartment's image
+    descriptions into a single string. Malformed records are skipped with a
+    warning, so their apartments are reported as failed instead of aborting
+    the run.
+    Args:
+        path (str): The apartment image descriptions JSON file
+    Returns:
+        dict: Apartment ID -> combined description string
+    """
+    with open(path, "r") as f:
+        apartments = json.load(f)
+    descriptions = {}
+    for i, apartment in enumerate(apartments):
+        try:
+            descriptions[apartment["id"]] = " ".join(image["description"] for image in apartment["images"])
+        except (KeyError, TypeError) as e:
+            apartment_id = apartment.get("id") if isinstance(apartment, dict) else None
+            label = f"apartment {apartment_id}" if apartment_id is not None else f"record {i}"
+            print(f"Warning: skipping malformed image descriptions for {label}: {e!r}")
+    return descriptions
+
 def load_semantic_description_doc_for_apartment(apartment_id) -> str:
     """
     Load and combine all semantic descriptions for an apartment's images into a single string.
@@ -44,21 +137,10 @@ def load_semantic_description_doc_for_apartment(apartment_id) -> str:
     Returns:
         str: A combined string of all image descriptions for the apartment.
     """
-    with open(APARTMENT_IMAGE_DESCRIPTIONS_FILE, "r") as f:
-        apartments = json.load(f)
-        
-    # Find the apartment with matching ID
-    apartment = next((apt for apt in apartments if apt["id"] == apartment_id), None)
-    if not apartment:
+    description = load_semantic_descriptions_by_id().get(apartment_id)
+    if description is None:
         raise ValueError(f"Apartment with ID {apartment_id} not found")
-        
-    # Combine all image descriptions into a single string
-    all_descriptions = []
-    for image in apartment["images"]:
-        all_descriptions.append(image["description"])
-        
-    # Join all descriptions with a space separator
-    return " ".join(all_descriptions)
+    return description
 
 def load_data_for_apartment(apartment_id) -> dict:
     """
@@ -68,50 +150,26 @@ def load_data_for_apartment(apartment_id) -> dict:
     Returns:
         dict: The Pinecone entry for the apartment.
     """
-    with open(INPUT_FILE, "r") as f:
-        apartments = json.load(f)
-        
-    # Find the apartment with matching ID
-    apartment = next((apt for apt in apartments if apt["id"] == apartment_id), None)
+    apartment = load_apartments_by_id().get(apartment_id)
     if not apartment:
         raise ValueError(f"Apartment with ID {apartment_id} not found")
-        
     return apartment
 
-def load_filters_for_apartment(apartment_id) -> dict:
+def _max_count(value: str) -> int:
+    # "Studio" counts as 0; otherwise take the largest number, e.g. "1-2 Beds" -> 2
+    if "studio" in value.lower():
+        return 0
+    numbers = re.findall(r'\d+', value)
+    return max([int(n) for n in numbers]) if numbers else 0
+
+def filters_for_apartment(apartment: dict) -> dict:
     """
-    Load the filters for an apartment from the input file.
+    Compute the metadata filters for an apartment record.
     Args:
-        apartment_id (str): The ID of the apartment to load the filters for.
+        apartment (dict): The apartment record from the input file
     Returns:
         dict: The filters for the apartment including bedrooms, bathrooms, and price range.
     """
-    with open(INPUT_FILE, "r") as f:
-        apartments = json.load(f)
-        
-    # Find the apartment with matching ID
-    apartment = next((apt for apt in apartments if apt["id"] == apartment_id), None)
-    if not apartment:
-        raise ValueError(f"Apartment with ID {apartment_id} not found")
-        
-    # Extract and process bedrooms
-    beds_str = apartment["beds"]
-    if "studio" in beds_str.lower():
-        beds = 0
-    else:
-        # Find all numbers in the string and take the maximum
-        numbers = re.findall(r'\d+', beds_str)
-        beds = max([int(n) for n in numbers]) if numbers else 0
-
-    # Extract and process bathrooms
-    baths_str = apartment["baths"]
-    if "studio" in baths_str.lower():
-        baths = 0
-    else:
-        # Find all numbers in the string and take the maximum
-        numbers = re.findall(r'\d+', baths_str)
-        baths = max([int(n) for n in numbers]) if numbers else 0
-        
     # Extract and process price range
     price_min = apartment["rent"]["min"]
     price_max = apartment["rent"]["max"]
@@ -124,15 +182,22 @@ def load_filters_for_apartment(apartment_id) -> dict:
     elif price_min is None and price_max is None:
         price_min = price_max = 0  # Default to 0 if both are None
         
-    # Extract filters from the apartment data
-    filters = {
-        "bedrooms": beds,
-        "bathrooms": baths,
+    return {
+        "bedrooms": _max_count(apartment["beds"]),
+        "bathrooms": _max_count(apartment["baths"]),
         "price_min": price_min,
         "price_max": price_max
     }
 
-    return filters
+def load_filters_for_apartment(apartment_id) -> dict:
+    """
+    Load the filters for an apartment from the input file.
+    Args:
+        apartment_id (str): The ID of the apartment to load the filters for.
+    Returns:
+        dict: The filters for the apartment including bedrooms, bathrooms, and price range.
+    """
+    return filters_for_apartment(load_data_for_apartment(apartment_id))
 
 def generate_apartment_pinecone_entry(apartment_id: str) -> PineconeEntry:
     """
@@ -147,7 +212,7 @@ def generate_apartment_pinecone_entry(apartment_id: str) -> PineconeEntry:
     filters = load_filters_for_apartment(apartment_id)
     
     # Generate embedding for the semantic description
-    embedding = model.encode(semantic_description)
+    embedding = get_model().encode(semantic_description)
     
     # Prepare metadata
     metadata = {
@@ -158,6 +223,56 @@ def generate_apartment_pinecone_entry(apartment_id: str) -> PineconeEntry:
     return PineconeEntry(id=apartment_id, embedding=embedding, metadata=metadata)
     
 
+def _init_embedding_worker(torch_threads: int):
+    # Split the cores between workers instead of letting every worker's torch
+    # thread pool use all of them
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    get_model()
+
+def _encode_batch(texts: list, batch_size: int):
+    return get_model().encode(texts, batch_size=batch_size, show_progress_bar=False)
+
+def iter_embedding_batches(texts: list[str], batch_size: int = EMBEDDING_BATCH_SIZE, workers: int = EMBEDDING_WORKERS):
+    """
+    Encode texts in batches, yielding each batch as soon as it is ready.
+
+    Texts are sorted by length first so each batch holds texts of similar
+    length and little of the model's work goes into padding. With more than
+    one worker the batches are spread over a process pool, each process with
+    its own copy of the model.
+    Args:
+        texts (list[str]): The texts to encode
+        batch_size (int): Texts per batch
+        workers (int): Encoding processes; 1 encodes in this process
+    Yields:
+        tuple: (positions of the batch's texts in texts, matrix of their embeddings)
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+    if workers <= 1 or len(batches) <= 1:
+        for positions in batches:
+            yield positions, _encode_batch([texts[i] for i in positions], batch_size)
+        return
+
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_embedding_worker,
+        initargs=(torch_threads,),
+    ) as executor:
+        results = executor.map(
+            _encode_batch,
+            ([texts[i] for i in positions] for positions in batches),
+            [batch_size] * len(batches),
+        )
+        for positions, embeddings in zip(batches, results):
+            yield positions, embeddings
+
 def check_and_delete_index(index_name: str):
     """
     Check if an index exists and delete it if it does.
@@ -204,68 +319,586 @@ def insert_apartment_into_index(index_name: str, entry: PineconeEntry):
         }]
     )
 
-def batch_insert_apartments(index_name: str, entries: list[PineconeEntry], batch_size: int = 100):
+def _vector_record(entry: PineconeEntry) -> dict:
+    embedding = entry.embedding
+    return {
+        "id": entry.id,
+        "values": embedding.tolist() if hasattr(embedding, "tolist") else list(embedding),
+        "metadata": entry.metadata
+    }
+
+def _estimated_payload_bytes(record: dict) -> int:
+    # Upper bound on the record's JSON size without serializing the values:
+    # a float never takes more than 24 characters plus its separator
+    return len(json.dumps(record["id"])) + len(json.dumps(record["metadata"])) + 25 * len(record["values"]) + 50
+
+# Connection failures and timeouts raised before Pinecone sent a response
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, MaxRetryError, ProtocolError, Urllib3TimeoutError)
+
+def _is_retryable(error: Exception) -> bool:
+    # Throttling (429), server errors and dropped connections are worth
+    # retrying; anything else (bad dimension, payload too large, a malformed
+    # record) is raised straight away
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    status = getattr(error, "status", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+def upsert_with_retry(index, vectors: list, namespace: str = None) -> int:
+    """
+    Upsert vectors, retrying throttled or failed requests with exponential backoff.
+    Args:
+        index: The Pinecone index handle
+        vectors (list): Records with id, values and metadata
+        namespace (str): The namespace to write to (default: the index's default)
+    Returns:
+        int: Number of retries it took
+    """
+    for attempt in range(UPSERT_MAX_RETRIES + 1):
+        try:
+            if namespace:
+                index.upsert(vectors=vectors, namespace=namespace)
+            else:
+                index.upsert(vectors=vectors)
+            return attempt
+        except Exception as e:
+            if attempt == UPSERT_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = UPSERT_BACKOFF_SECONDS * 2 ** attempt
+            time.sleep(delay + random.uniform(0, delay))
+
+class UpsertPipeline:
+    """
+    Streams vectors into a Pinecone index with a bounded window of concurrent
+    upserts.
+
+    Entries are grouped into batches capped by vector count and by JSON
+    payload size. A full batch is sent on a worker thread right away, and
+    add() blocks while `concurrency` batches are in flight, so a fast
+    producer never queues more than that. Throttled or failed batches are
+    retried with exponential backoff and jitter. One index handle is shared
+    by every batch.
+    """
+
+    def __init__(
+        self,
+        index_name: str,
+        concurrency: int = UPSERT_CONCURRENCY,
+        max_batch_vectors: int = UPSERT_MAX_BATCH_VECTORS,
+        max_batch_bytes: int = UPSERT_MAX_BATCH_BYTES,
+        progress=None,
+    ):
+        self.index = pc.Index(index_name, pool_threads=concurrency)
+        self.concurrency = concurrency
+        self.max_batch_vectors = max_batch_vectors
+        self.max_batch_bytes = max_batch_bytes
+        self.progress = progress
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upsert")
+        self.in_flight = set()
+        self.batch = []
+        self.batch_bytes = 0
+        self.upserted = 0
+        self.retries = 0
+
+    def add(self, entry: PineconeEntry):
+        """
+        Queue an entry, sending the current batch first if the entry would overflow it.
+        Args:
+            entry (PineconeEntry): The apartment to upsert
+        """
+        record = _vector_record(entry)
+        size = _estimated_payload_bytes(record)
+        if self.batch and (
+            len(self.batch) >= self.max_batch_vectors or self.batch_bytes + size > self.max_batch_bytes
+        ):
+            self._send()
+        self.batch.append(record)
+        self.batch_bytes += size
+
+    def _send(self):
+        while len(self.in_flight) >= self.concurrency:
+            self._collect(FIRST_COMPLETED)
+        self.in_flight.add(self.executor.submit(self._upsert, self.batch))
+        self.batch = []
+        self.batch_bytes = 0
+
+    def _collect(self, return_when):
+        done, self.in_flight = wait(self.in_flight, return_when=return_when)
+        for future in done:
+            count, retries = future.result()
+            self.upserted += count
+            self.retries += retries
+            if self.progress is not None:
+                self.progress.update(count)
+
+    def _upsert(self, vectors: list) -> tuple[int, int]:
+        return len(vectors), upsert_with_retry(self.index, vectors)
+
+    def flush(self) -> int:
+        """
+        Send the last partial batch and wait for every upsert to finish.
+        Returns:
+            int: Total vectors upserted
+        """
+        if self.batch:
+            self._send()
+        while self.in_flight:
+            self._collect(FIRST_COMPLETED)
+        return self.upserted
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+def batch_insert_apartments(index_name: str, entries: list[PineconeEntry], batch_size: int = UPSERT_MAX_BATCH_VECTORS):
     """
-    Insert multiple apartments into the Pinecone index in batches.
+    Insert multiple apartments into the Pinecone index in concurrent batches.
     Args:
         index_name (str): The name of the index to insert into
         entries (list[PineconeEntry]): List of apartment entries to insert
-        batch_size (int): Size of each batch for insertion
+        batch_size (int): Most vectors per upsert request
+    """
+    with UpsertPipeline(index_name, max_batch_vectors=batch_size) as pipeline:
+        for entry in entries:
+            pipeline.add(entry)
+
+def read_index_alias(index_name: str = INDEX) -> dict:
+    """
+    Read the alias record the backend resolves a logical index name through.
+    Args:
+        index_name (str): The logical (base) index name
+    Returns:
+        dict: The record's metadata ("index", "previous", "updated_at"), or an
+            empty dict if none has been written
+    """
+    if index_name not in pc.list_indexes().names():
+        return {}
+    response = pc.Index(index_name).fetch(ids=[ALIAS_RECORD_ID], namespace=ALIAS_NAMESPACE)
+    record = (response.vectors or {}).get(ALIAS_RECORD_ID)
+    return dict(getattr(record, "metadata", None) or {})
+
+def active_index_name(index_name: str = INDEX) -> str:
+    """
+    Get the Pinecone index the backend currently serves for a logical name.
+    Args:
+        index_name (str): The logical index name
+    Returns:
+        str: The versioned index its alias points at, or index_name itself
+    """
+    return read_index_alias(index_name).get("index") or index_name
+
+def new_index_version() -> str:
+    """
+    Make a version string for the index contents; later versions sort higher.
+    Returns:
+        str: The version
+    """
+    return datetime.now().strftime("%Y%m%d%H%M%S%f")
+
+def write_index_alias(index_name: str, target: str, previous: str = None, version: str = None,
+                      dimension: int = 384):
+    """
+    Point a logical index name at the Pinecone index that now serves it, and
+    record the version of its contents. Backends key their caches on that
+    version, so bumping it invalidates them everywhere. The alias is a single
+    record, so backends see either the old or the new one.
+    Args:
+        index_name (str): The logical (base) index name; created if missing
+        target (str): The Pinecone index now serving it
+        previous (str): The index it replaced, kept for --rollback; "" records
+            none (default: whatever the alias already records)
+        version (str): The contents' version (default: a new one)
+        dimension (int): The base index's dimension
+    """
+    if index_name not in pc.list_indexes().names():
+        create_index(index_name, dimension)
+    metadata = {
+        "index": target,
+        "version": version or new_index_version(),
+        "updated_at": datetime.now().isoformat(),
+    }
+    if previous is None:
+        previous = read_index_alias(index_name).get("previous")
+    if previous:
+        metadata["previous"] = previous
+    # Cosine indexes reject all-zero vectors; the record is never queried
+    # since it lives outside the default namespace
+    upsert_with_retry(
+        pc.Index(index_name),
+        [{"id": ALIAS_RECORD_ID, "values": [1.0] + [0.0] * (dimension - 1), "metadata": metadata}],
+        namespace=ALIAS_NAMESPACE,
+    )
+    print(f"Index alias updated ({index_name} -> {target}, version {metadata['version']})")
+
+def write_index_version_stamp(index_name: str, target: str = None, version: str = None):
+    """
+    Record that the index changed so a backend on this host drops cached
+    search results even when it doesn't read the alias (e.g. the local
+    vector store). The stamp is replaced in a single rename.
+    Args:
+        index_name (str): The logical name of the index that was (re)built
+        target (str): The Pinecone index now serving it (default: index_name)
+        version (str): The contents' version (default: a new one)
+    """
+    stamp = {
+        "version": version or new_index_version(),
+        "index": target or index_name,
+        "updated_at": datetime.now().isoformat(),
+    }
+    directory = os.path.dirname(os.path.abspath(INDEX_VERSION_FILE))
+    os.makedirs(directory, exist_ok=True)
+    with open(INDEX_VERSION_FILE + ".tmp", "w") as f:
+        json.dump(stamp, f)
+    os.replace(INDEX_VERSION_FILE + ".tmp", INDEX_VERSION_FILE)
+    print(f"Index version stamp updated to {stamp['version']}")
+
+def publish_index(target: str, previous: str = None):
+    """
+    Serve target for INDEX under a new version, in the alias record every
+    backend reads and in this host's stamp.
+    Args:
+        target (str): The Pinecone index now serving INDEX
+        previous (str): Passed on to write_index_alias
+    """
+    version = new_index_version()
+    write_index_alias(INDEX, target, previous=previous, version=version)
+    write_index_version_stamp(INDEX, target=target, version=version)
+
+def served_vector_count(index_name: str) -> int:
+    """
+    Count the vectors an index would serve searches from, i.e. leaving out
+    the alias record the base index holds.
+    Args:
+        index_name (str): The name of the index to check
+    Returns:
+        int: The number of vectors, or 0 if the index doesn't exist
+    """
+    if index_name not in pc.list_indexes().names():
+        return 0
+    stats = pc.Index(index_name).describe_index_stats()
+    alias = (getattr(stats, "namespaces", None) or {}).get(ALIAS_NAMESPACE)
+    return stats.total_vector_count - (alias.vector_count if alias else 0)
+
+def wait_for_vector_count(index_name: str, expected: int, timeout: float = VERIFY_TIMEOUT) -> int:
+    """
+    Wait until the index reports the expected number of vectors.
+    Args:
+        index_name (str): The name of the index to check
+        expected (int): The number of vectors that were upserted
+        timeout (float): Seconds to wait for the count to settle
+    Returns:
+        int: The last count the index reported
     """
     index = pc.Index(index_name)
-    
-    # Process entries in batches
-    for i in range(0, len(entries), batch_size):
-        batch = entries[i:i + batch_size]
-        vectors = [{
-            "id": entry.id,
-            "values": entry.embedding.tolist(),
-            "metadata": entry.metadata
-        } for entry in batch]
-        
-        index.upsert(vectors=vectors)
+    deadline = time.monotonic() + timeout
+    while True:
+        count = index.describe_index_stats().total_vector_count
+        if count >= expected or time.monotonic() >= deadline:
+            return count
+        time.sleep(2)
 
-def main():
-    # Load all apartments from the sample file
-    with open(INPUT_FILE, "r") as f:
-        apartments = json.load(f)
-    
-    # Check and delete existing index if it exists
-    check_and_delete_index(INDEX)
-    
-    # Create new index
-    create_index(INDEX)
-    
-    entries = []
+def verify_index(index_name: str, documents: list, samples: int) -> list[str]:
+    """
+    Check a freshly built index before it is put in service: it must hold a
+    vector for every document, and querying with sample documents' own
+    embeddings must return those documents first.
+    Args:
+        index_name (str): The name of the index to check
+        documents (list): (apartment_id, description, metadata) tuples that were loaded
+        samples (int): Number of documents to query with
+    Returns:
+        list[str]: Problems found; empty if the index is good
+    """
+    problems = []
+    count = wait_for_vector_count(index_name, len(documents))
+    if count != len(documents):
+        problems.append(f"{index_name} has {count} vectors, expected {len(documents)}")
+
+    index = pc.Index(index_name)
+    step = max(1, len(documents) // max(samples, 1))
+    for apartment_id, description, _ in documents[::step][:samples]:
+        results = index.query(vector=get_model().encode(description).tolist(), top_k=1, include_metadata=True)
+        top = results.matches[0] if results.matches else None
+        if top is None:
+            problems.append(f"Query for {apartment_id} returned nothing")
+        elif top.id != apartment_id and top.score < VERIFY_MIN_SCORE:
+            problems.append(f"Query for {apartment_id} returned {top.id} (score {top.score:.4f})")
+    return problems
+
+def prune_old_indexes(index_name: str, keep: set):
+    """
+    Delete earlier versions of an index, except the ones in keep. The base
+    index itself is never deleted: it holds the alias record.
+    Args:
+        index_name (str): The logical index name
+        keep (set): Pinecone index names to keep, e.g. the live and previous ones
+    """
+    for name in pc.list_indexes().names():
+        versioned = name.startswith(index_name + "-") and name[len(index_name) + 1:].isdigit()
+        if versioned and name not in keep:
+            check_and_delete_index(name)
+
+def content_hash(description: str, metadata: dict) -> str:
+    """
+    Hash everything that determines an apartment's vector and metadata.
+    Args:
+        description (str): The combined semantic description
+        metadata (dict): The Pinecone metadata
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    payload = json.dumps(
+        {"model": EMBEDDING_MODEL_NAME, "description": description, "metadata": metadata},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def load_manifest(index_name: str) -> dict:
+    """
+    Load the content hashes recorded for an index by the previous run.
+    Args:
+        index_name (str): The index the manifest must describe
+    Returns:
+        dict: Apartment ID -> content hash; empty if there is no manifest or
+        it was written for another index
+    """
+    if not os.path.exists(INDEX_MANIFEST_FILE):
+        return {}
+    with open(INDEX_MANIFEST_FILE, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("index") != index_name:
+        return {}
+    return manifest.get("hashes", {})
+
+def write_manifest(index_name: str, hashes: dict):
+    """
+    Record the content hash of every apartment now in the index.
+    Args:
+        index_name (str): The index the hashes describe
+        hashes (dict): Apartment ID -> content hash
+    """
+    directory = os.path.dirname(os.path.abspath(INDEX_MANIFEST_FILE))
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"index": index_name, "updated_at": datetime.now().isoformat(), "hashes": hashes}
+    with open(INDEX_MANIFEST_FILE + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(INDEX_MANIFEST_FILE + ".tmp", INDEX_MANIFEST_FILE)
+
+def delete_apartments(index_name: str, apartment_ids: list[str]):
+    """
+    Delete apartments' vectors from the Pinecone index.
+    Args:
+        index_name (str): The name of the index to delete from
+        apartment_ids (list[str]): The IDs to delete
+    """
+    index = pc.Index(index_name)
+    for i in range(0, len(apartment_ids), DELETE_BATCH_SIZE):
+        index.delete(ids=apartment_ids[i:i + DELETE_BATCH_SIZE])
+
+def prepare_documents(apartments: list[dict]) -> tuple[list, list]:
+    """
+    Build the description and metadata to index for each apartment.
+    Args:
+        apartments (list[dict]): Apartment records from the input file
+    Returns:
+        tuple: ([(apartment_id, description, metadata)], [(apartment_id, error)])
+    """
+    documents = []
     failed_apartments = []
-    
-    # Process each apartment with a progress bar
-    print("\nProcessing apartments...")
-    for apartment in tqdm(apartments, desc="Processing apartments"):
+    for apartment in apartments:
+        apartment_id = apartment["id"]
         try:
-            apartment_id = apartment["id"]
-            entry = generate_apartment_pinecone_entry(apartment_id)
-            entries.append(entry)
+            description = load_semantic_description_doc_for_apartment(apartment_id)
+            metadata = {"apartment_id": apartment_id, **filters_for_apartment(apartment)}
+            documents.append((apartment_id, description, metadata))
         except Exception as e:
             failed_apartments.append((apartment_id, str(e)))
-            continue
-    
-    # Insert all entries in batches with a progress bar
-    print("\nInserting into Pinecone...")
-    batch_size = 100
-    num_batches = (len(entries) + batch_size - 1) // batch_size
-    
-    for i in tqdm(range(0, len(entries), batch_size), desc="Inserting batches", total=num_batches):
-        batch = entries[i:i + batch_size]
-        batch_insert_apartments(INDEX, batch, batch_size)
+    return documents, failed_apartments
+
+def embed_and_insert(index_name: str, documents: list, args) -> int:
+    """
+    Embed documents and upsert them into the Pinecone index. Each embedding
+    batch is handed to the upsert pipeline as soon as it is encoded, so
+    uploading overlaps with embedding the rest of the catalog.
+    Args:
+        index_name (str): The name of the index to insert into
+        documents (list): (apartment_id, description, metadata) tuples
+        args: Parsed command line arguments
+    Returns:
+        int: Number of vectors upserted
+    """
+    print("\nEmbedding and inserting into Pinecone...")
+    start = time.perf_counter()
+    embedded = 0
+    texts = [description for _, description, _ in documents]
+    with tqdm(total=len(documents), desc="Embedding descriptions") as embedding_progress, \
+            tqdm(total=len(documents), desc="Upserting vectors") as upsert_progress:
+        with UpsertPipeline(index_name, concurrency=args.upsert_concurrency, progress=upsert_progress) as pipeline:
+            for positions, embeddings in iter_embedding_batches(texts, args.batch_size, args.workers):
+                for position, embedding in zip(positions, embeddings):
+                    apartment_id, _, metadata = documents[position]
+                    pipeline.add(PineconeEntry(id=apartment_id, embedding=embedding, metadata=metadata))
+                embedded += len(positions)
+                embedding_progress.update(len(positions))
+            embedding_elapsed = time.perf_counter() - start
+        elapsed = time.perf_counter() - start
+
+    print(f"Embedded {embedded} descriptions in {embedding_elapsed:.1f}s ({embedded / max(embedding_elapsed, 1e-9):.1f} docs/sec)")
+    print(
+        f"Upserted {pipeline.upserted} vectors in {elapsed:.1f}s "
+        f"({pipeline.upserted / max(elapsed, 1e-9):.1f} vectors/sec, {pipeline.retries} retries)"
+    )
+    return pipeline.upserted
+
+def rebuild_index(documents: list, args) -> int:
+    """
+    Build a new versioned index next to the live one, verify it, then flip
+    the alias the backend reads. The live index keeps serving until the flip
+    and is kept afterwards for --rollback; older versions are deleted, but
+    never the base index.
+    Args:
+        documents (list): (apartment_id, description, metadata) tuples
+        args: Parsed command line arguments
+    Returns:
+        int: Number of vectors upserted
+    """
+    live = active_index_name(INDEX)
+    new_index = f"{INDEX}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    create_index(new_index)
+
+    inserted = embed_and_insert(new_index, documents, args)
+
+    print(f"\nVerifying {new_index}...")
+    problems = verify_index(new_index, documents, args.verify_samples)
+    if problems:
+        for problem in problems:
+            print(f"- {problem}")
+        raise SystemExit(f"Verification failed; {live} is still live and {new_index} was left for inspection")
+
+    write_manifest(new_index, {
+        apartment_id: content_hash(description, metadata)
+        for apartment_id, description, metadata in documents
+    })
+    # An empty live index (e.g. the base index on a first rebuild) is no
+    # rollback target
+    previous = live if served_vector_count(live) > 0 else ""
+    publish_index(new_index, previous=previous)
+    prune_old_indexes(INDEX, keep={new_index, live})
+    return inserted
+
+def update_index(documents: list, args, failed_ids=()) -> int:
+    """
+    Bring the live index in line with the documents without dropping it:
+    upsert new or changed apartments and delete removed ones, as found by
+    comparing content hashes with the manifest of the previous run.
+    Apartments that failed to prepare this run are left as they are, vectors
+    and manifest entries alike, so a transient failure never deletes data.
+    Args:
+        documents (list): (apartment_id, description, metadata) tuples
+        args: Parsed command line arguments
+        failed_ids: IDs of apartments that are still in the input but could
+            not be prepared
+    Returns:
+        int: Number of vectors upserted
+    """
+    live = active_index_name(INDEX)
+    if live not in pc.list_indexes().names():
+        create_index(live)
+        previous = {}
+    else:
+        previous = load_manifest(live)
+
+    hashes = {
+        apartment_id: content_hash(description, metadata)
+        for apartment_id, description, metadata in documents
+    }
+    changed = [document for document in documents if previous.get(document[0]) != hashes[document[0]]]
+    failed_ids = set(failed_ids)
+    removed = [
+        apartment_id for apartment_id in previous
+        if apartment_id not in hashes and apartment_id not in failed_ids
+    ]
+    kept = {apartment_id: previous[apartment_id] for apartment_id in failed_ids if apartment_id in previous}
+    if kept:
+        print(f"Keeping {len(kept)} indexed apartments that failed to prepare this run")
+    print(f"\n{len(changed)} new or changed, {len(removed)} removed, {len(documents) - len(changed)} unchanged")
+    if not changed and not removed:
+        return 0
+
+    inserted = embed_and_insert(live, changed, args) if changed else 0
+    if removed:
+        print(f"Deleting {len(removed)} removed apartments...")
+        delete_apartments(live, removed)
+    write_manifest(live, {**kept, **hashes})
+    publish_index(live)
+    return inserted
+
+def rollback_index():
+    """
+    Point the alias back at the index the last rebuild replaced, unless it
+    has since been deleted or holds no vectors.
+    """
+    alias = read_index_alias(INDEX)
+    live = alias.get("index") or INDEX
+    previous = alias.get("previous")
+    if not previous or previous == live:
+        raise SystemExit(f"No previous index recorded for {INDEX}")
+    if previous not in pc.list_indexes().names():
+        raise SystemExit(f"Previous index {previous} no longer exists")
+    if served_vector_count(previous) == 0:
+        raise SystemExit(f"Previous index {previous} is empty; not switching to it")
+    publish_index(previous, previous=live)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embed apartment descriptions and load them into Pinecone")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="descriptions per embedding batch")
+    parser.add_argument("--workers", type=int, default=EMBEDDING_WORKERS, help="embedding processes (1 encodes in this process)")
+    parser.add_argument("--upsert-concurrency", type=int, default=UPSERT_CONCURRENCY, help="upsert batches in flight at once")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only embed new or changed apartments and delete removed ones, keeping the live index",
+    )
+    parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="serve the index the last rebuild replaced again, then exit",
+    )
+    parser.add_argument("--verify-samples", type=int, default=VERIFY_SAMPLES, help="documents queried to verify a rebuilt index")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.rollback:
+        rollback_index()
+        return
+
+    # Parse both input files once; every per-apartment lookup below is a dict hit
+    apartments = list(load_apartments_by_id().values())
+    load_semantic_descriptions_by_id()
     
+    print("\nProcessing apartments...")
+    documents, failed_apartments = prepare_documents(apartments)
+
+    if args.incremental:
+        failed_ids = [apartment_id for apartment_id, _ in failed_apartments]
+        inserted = update_index(documents, args, failed_ids=failed_ids)
+    else:
+        inserted = rebuild_index(documents, args)
+
     # Print summary
     print(f"\nSummary:")
-    print(f"Successfully processed and inserted {len(entries)} apartments")
+    print(f"Successfully processed and inserted {inserted} apartments")
     if failed_apartments:
         print(f"Failed to process {len(failed_apartments)} apartments:")
         for apartment_id, error in failed_apartments:
             print(f"- Apartment {apartment_id}: {error}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()